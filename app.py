@@ -1,18 +1,43 @@
 import customtkinter as ctk
-import requests
 import concurrent.futures
+import queue
 import threading
 import re
 import socket
 import os
 import signal
 import sys
-from time import time
+from itertools import islice
+from time import perf_counter, time
+from tkinter import filedialog
+
+from cancel import Canceller
+from metrics import MetricsServer, registry
+from proxy_files import ProxySource, count_lines, read_preview, write_lines
+from ranking import RankedOutput
+from result_view import ResultTable
+from probe import ProbeError, detect_protocol, socks_handshake, target_address
+from results import open_writer
+from retry import CheckScheduler, classify_exception, classify_response
+from scheduling import ORDER_MODES, load_history, order_proxies, update_history
 
 
 WORKING_FILE = "working.txt"
 DOWN_FILE = "down.txt"
 SAVE_STATE_FILE = "proxy_state.txt"
+RESULTS_FILE = "results.jsonl"
+HISTORY_FILE = "history.jsonl"
+RANKED_FILE = "ranked.txt"
+TOP_K = 100
+GEO_API_URL = "http://ip-api.com/json"
+METRICS_PORT = 9899
+MAX_WORKERS = 50
+IN_FLIGHT_PER_WORKER = 4
+STOP_GRACE = 2
+LOG_LINES = 500
+STATE_CHUNK_LINES = 20000
+STATE_INSERT_BUDGET = 0.02
+TEXTBOX_MAX_LINES = 50000
 
 
 class ProxyCheckerApp(ctk.CTk):
@@ -25,17 +50,45 @@ class ProxyCheckerApp(ctk.CTk):
         self.grid_rowconfigure(2, weight=1)
 
         self.is_checking = False
+        self.loading_state = False
         self.stop_event = threading.Event()
-        self.thread_pool = None
-        self.remaining_proxies = []
+        self.canceller = Canceller()
+        self.completed = queue.Queue()
+        self.stopping = threading.Event()
+        self.run_id = 0
+        self.remaining_proxies = {}
+        self.source = None
+        self.source_count = 0
+        self.run_source = None
         self.checker_thread = None
+        self.results_writer = None
+        self.ranked = None
+        self.history_pending = False
+        self.handshake_only = False
+        self.order_mode = "input"
+        self.stop_after = None
 
         self.create_widgets()
 
+        self.start_metrics_server()
+
         self.load_saved_state()
 
+        self.after(250, self.preload_modules)
+
         self.protocol("WM_DELETE_WINDOW", self.on_closing)
 
+    def preload_modules(self):
+        """
+        Imports the network stack in the background once the window is up,
+        so startup does not wait for it and the first check does not either.
+        """
+
+        def preload():
+            import requests
+
+        threading.Thread(target=preload, daemon=True).start()
+
     def create_widgets(self):
         """Create and layout all the GUI widgets."""
 
@@ -46,6 +99,10 @@ class ProxyCheckerApp(ctk.CTk):
         ctk.CTkLabel(top_frame, text="Proxy List:").grid(
             row=0, column=0, padx=10, pady=(10, 0), sticky="w"
         )
+        self.import_button = ctk.CTkButton(
+            top_frame, text="Import File...", width=110, command=self.import_file
+        )
+        self.import_button.grid(row=0, column=1, padx=10, pady=(10, 0), sticky="e")
         self.proxy_textbox = ctk.CTkTextbox(top_frame, height=150)
         self.proxy_textbox.grid(
             row=1, column=0, columnspan=2, padx=10, pady=5, sticky="ew"
@@ -74,9 +131,41 @@ class ProxyCheckerApp(ctk.CTk):
         self.title_entry.insert(0, "<title>Google</title>")
         self.add_context_menu(self.title_entry)
 
+        options_frame = ctk.CTkFrame(top_frame, fg_color="transparent")
+        options_frame.grid(
+            row=6, column=0, columnspan=2, padx=10, pady=(5, 10), sticky="ew"
+        )
+
+        self.handshake_only_checkbox = ctk.CTkCheckBox(
+            options_frame, text="SOCKS handshake only (skip HTTP validation)"
+        )
+        self.handshake_only_checkbox.grid(row=0, column=0, padx=(0, 20), sticky="w")
+
+        ctk.CTkLabel(options_frame, text="Order:").grid(
+            row=0, column=1, padx=(0, 5), sticky="w"
+        )
+        self.order_menu = ctk.CTkOptionMenu(
+            options_frame, values=[mode.capitalize() for mode in ORDER_MODES], width=110
+        )
+        self.order_menu.grid(row=0, column=2, padx=(0, 20), sticky="w")
+
+        ctk.CTkLabel(options_frame, text="Stop after (working):").grid(
+            row=0, column=3, padx=(0, 5), sticky="w"
+        )
+        self.stop_after_entry = ctk.CTkEntry(
+            options_frame, width=80, placeholder_text="all"
+        )
+        self.stop_after_entry.grid(row=0, column=4, padx=(0, 20), sticky="w")
+        self.add_context_menu(self.stop_after_entry)
+
+        self.rank_by_country_checkbox = ctk.CTkCheckBox(
+            options_frame, text=f"Rank top {TOP_K} per country"
+        )
+        self.rank_by_country_checkbox.grid(row=0, column=5, sticky="w")
+
         controls_frame = ctk.CTkFrame(self)
         controls_frame.grid(row=1, column=0, padx=10, pady=5, sticky="ew")
-        controls_frame.grid_columnconfigure((0, 1, 2, 3), weight=1)
+        controls_frame.grid_columnconfigure((0, 1, 2, 3, 4, 5), weight=1)
 
         self.start_button = ctk.CTkButton(
             controls_frame, text="Start Checking", command=self.start_checking
@@ -112,20 +201,42 @@ class ProxyCheckerApp(ctk.CTk):
         )
         self.clear_button.grid(row=0, column=3, padx=5, pady=5, sticky="ew")
 
+        self.export_working_button = ctk.CTkButton(
+            controls_frame,
+            text="Export Working",
+            command=lambda: self.export_results(True),
+            fg_color="#2E7D32",
+            hover_color="#1B5E20",
+        )
+        self.export_working_button.grid(row=0, column=4, padx=5, pady=5, sticky="ew")
+
+        self.export_down_button = ctk.CTkButton(
+            controls_frame,
+            text="Export Down",
+            command=lambda: self.export_results(False),
+            fg_color="#616161",
+            hover_color="#424242",
+        )
+        self.export_down_button.grid(row=0, column=5, padx=5, pady=5, sticky="ew")
+
         results_frame = ctk.CTkFrame(self)
         results_frame.grid(row=2, column=0, padx=10, pady=10, sticky="nsew")
         results_frame.grid_columnconfigure(0, weight=1)
         results_frame.grid_rowconfigure(0, weight=1)
 
-        self.results_textbox = ctk.CTkTextbox(
-            results_frame, state="disabled", text_color="white"
+        self.result_table = ResultTable(results_frame, fg_color="transparent")
+        self.result_table.grid(row=0, column=0, sticky="nsew")
+        self.add_context_menu(self.result_table.textbox)
+
+        self.log_textbox = ctk.CTkTextbox(
+            results_frame, height=90, state="disabled", text_color="white"
         )
-        self.results_textbox.grid(row=0, column=0, sticky="nsew")
-        self.results_textbox.tag_config("green", foreground="#66BB6A")
-        self.results_textbox.tag_config("red", foreground="#EF5350")
-        self.results_textbox.tag_config("yellow", foreground="#FFEE58")
-        self.results_textbox.tag_config("cyan", foreground="#26C6DA")
-        self.add_context_menu(self.results_textbox)
+        self.log_textbox.grid(row=1, column=0, pady=(5, 0), sticky="ew")
+        self.log_textbox.tag_config("green", foreground="#66BB6A")
+        self.log_textbox.tag_config("red", foreground="#EF5350")
+        self.log_textbox.tag_config("yellow", foreground="#FFEE58")
+        self.log_textbox.tag_config("cyan", foreground="#26C6DA")
+        self.add_context_menu(self.log_textbox)
 
         status_frame = ctk.CTkFrame(self)
         status_frame.grid(row=3, column=0, padx=10, pady=(0, 10), sticky="ew")
@@ -345,7 +456,7 @@ class ProxyCheckerApp(ctk.CTk):
             if not match:
                 return None
             host, port, user, password = match.groups()
-            proto = "http"
+            proto = "auto"
 
         return {
             "original": proxy_line,
@@ -357,18 +468,25 @@ class ProxyCheckerApp(ctk.CTk):
         }
 
     def get_country(self, host):
+        import requests
+
         try:
-            ip_address = socket.gethostbyname(host)
-            response = requests.get(
-                f"http://ip-api.com/json/{ip_address}?fields=country,countryCode",
-                timeout=2,
-            )
-            data = response.json()
+            with registry.stage("dns"):
+                ip_address = socket.gethostbyname(host)
+            with registry.stage("geo"):
+                response = requests.get(
+                    f"{GEO_API_URL}/{ip_address}?fields=country,countryCode",
+                    timeout=2,
+                )
+                data = response.json()
             return f"{data.get('country', 'N/A')} ({data.get('countryCode', 'N/A')})"
         except (socket.gaierror, requests.RequestException):
             return "N/A"
 
+    @registry.busy_worker()
     def check_proxy(self, proxy_info, target_url, validation_text):
+        import requests
+
         if self.stop_event.is_set():
             return None
         protocol, host, port, user, password = (
@@ -379,65 +497,118 @@ class ProxyCheckerApp(ctk.CTk):
             proxy_info["password"],
         )
 
-        if protocol == "socks4":
-            proxy_url = f"socks4://{host}:{port}"
-        elif protocol == "socks5":
-            if user and password:
-                proxy_url = f"socks5://{user}:{password}@{host}:{port}"
-            else:
-                proxy_url = f"socks5://{host}:{port}"
-        else:
-            if user and password:
-                proxy_url = f"http://{user}:{password}@{host}:{port}"
-            else:
-                proxy_url = f"http://{host}:{port}"
-
-        proxies_dict = {"http": proxy_url, "https": proxy_url}
         result = {
             "proxy": proxy_info["original"],
+            "protocol": protocol,
             "status": "Inactive",
             "ping": -1,
             "country": "N/A",
             "error": "Unknown",
+            "error_class": None,
+            "attempts": proxy_info.get("attempts", 1),
         }
 
         try:
 
-            if self.stop_event.is_set():
-                return None
-            result["country"] = self.get_country(host)
+            if protocol == "auto":
+                with registry.stage("detect"):
+                    protocol = detect_protocol(
+                        host, port, *target_address(target_url), timeout=5
+                    )
+                proxy_info = dict(proxy_info, protocol=protocol)
+                result["protocol"] = protocol
+
+            if protocol == "socks4":
+                proxy_url = f"socks4://{host}:{port}"
+            elif protocol == "socks5":
+                if user and password:
+                    proxy_url = f"socks5://{user}:{password}@{host}:{port}"
+                else:
+                    proxy_url = f"socks5://{host}:{port}"
+            else:
+                if user and password:
+                    proxy_url = f"http://{user}:{password}@{host}:{port}"
+                else:
+                    proxy_url = f"http://{host}:{port}"
+
+            proxies_dict = {"http": proxy_url, "https": proxy_url}
+
+            handshake_only = self.handshake_only and protocol in ("socks4", "socks5")
+            if protocol in ("socks4", "socks5"):
+                if self.stop_event.is_set():
+                    return None
+                with registry.stage("handshake"):
+                    handshake_ms = socks_handshake(
+                        proxy_info, *target_address(target_url), timeout=5
+                    )
 
             if self.stop_event.is_set():
                 return None
-            start_time = time()
-            response = requests.get(
-                target_url,
-                proxies=proxies_dict,
-                timeout=5,
-                headers={"User-Agent": "Mozilla/5.0"},
-            )
-            result["ping"] = round((time() - start_time) * 1000)
-            if response.status_code == 200 and validation_text in response.text:
+            result["country"] = proxy_info.get("country") or self.get_country(host)
+
+            if handshake_only:
+                result["ping"] = handshake_ms
                 result["status"] = "Active"
                 result.pop("error")
             else:
-                result["error"] = f"Validation Failed (Status: {response.status_code})"
-        except requests.exceptions.ProxyError:
+                if self.stop_event.is_set():
+                    return None
+                start_time = time()
+                with registry.stage("connect"):
+                    response = requests.get(
+                        target_url,
+                        proxies=proxies_dict,
+                        timeout=5,
+                        headers={"User-Agent": "Mozilla/5.0"},
+                        stream=True,
+                    )
+                with response, registry.stage("validate"):
+                    body = response.text
+                    result["ping"] = round((time() - start_time) * 1000)
+                    valid = response.status_code == 200 and validation_text in body
+                if valid:
+                    result["status"] = "Active"
+                    result.pop("error")
+                else:
+                    result["error"] = (
+                        f"Validation Failed (Status: {response.status_code})"
+                    )
+                    result["error_class"] = classify_response(response.status_code)
+        except ProbeError as e:
+            result["error"] = str(e)
+            result["error_class"] = e.error_class
+        except requests.exceptions.ProxyError as e:
             result["error"] = "Proxy Error"
-        except requests.exceptions.ConnectTimeout:
+            result["error_class"] = classify_exception(e)
+        except requests.exceptions.ConnectTimeout as e:
             result["error"] = "Timeout"
-        except requests.exceptions.ConnectionError:
+            result["error_class"] = classify_exception(e)
+        except requests.exceptions.ConnectionError as e:
             result["error"] = "Connection Refused"
-        except requests.exceptions.RequestException:
+            result["error_class"] = classify_exception(e)
+        except requests.exceptions.RequestException as e:
             result["error"] = "Request Error"
-        except Exception:
+            result["error_class"] = classify_exception(e)
+        except Exception as e:
             result["error"] = "Unknown Error"
+            result["error_class"] = classify_exception(e)
 
         if self.stop_event.is_set():
             return None
+        registry.inc("checks_total", status=result["status"])
+        if result["status"] != "Active":
+            registry.inc("check_errors_total", error=result["error"])
         return result
 
+    def run_callback(self, run_id, callback, *args):
+        """Calls callback on the main thread unless its run was force stopped."""
+        if run_id == self.run_id:
+            callback(*args)
+
+    @registry.stage("ui")
     def update_ui_with_result(self, result):
+        registry.add_gauge("ui_pending", -1)
+        registry.add_gauge("queue_depth", -1)
         if not result:
             return
 
@@ -449,111 +620,330 @@ class ProxyCheckerApp(ctk.CTk):
             self.down_label.configure(text=f"Down: {self.down_count}")
 
         file_to_write = WORKING_FILE if result["status"] == "Active" else DOWN_FILE
-        try:
-            with open(file_to_write, "a") as f:
-                f.write(result["proxy"] + "\n")
-        except IOError as e:
-            self.log_message(f"Error writing to {file_to_write}: {e}\n", "red")
+        with registry.stage("write"):
+            try:
+                with open(file_to_write, "a") as f:
+                    f.write(result["proxy"] + "\n")
+            except IOError as e:
+                self.log_message(f"Error writing to {file_to_write}: {e}\n", "red")
 
-        try:
-            proxy_to_remove = result["proxy"]
-            self.remaining_proxies = [
-                p for p in self.remaining_proxies if p != proxy_to_remove
-            ]
-            self.update_proxy_textbox()
-        except Exception as e:
-            self.log_message(f"Error updating proxy list: {e}\n", "red")
+            if self.results_writer:
+                try:
+                    self.results_writer.write(result)
+                except Exception as e:
+                    self.log_message(f"Error writing to {RESULTS_FILE}: {e}\n", "red")
+                    self.results_writer = None
 
-        self.results_textbox.configure(state="normal")
-        if result["status"] == "Active":
-            self.results_textbox.insert("end", "Active   ", "green")
-            self.results_textbox.insert(
-                "end", f"| Ping: {result['ping']}ms ".ljust(15), "yellow"
-            )
+            if self.ranked:
+                try:
+                    self.ranked.add(result)
+                except OSError as e:
+                    self.log_message(f"Error writing to {RANKED_FILE}: {e}\n", "red")
+                    self.ranked = None
 
-            if result["country"] != "N/A":
-                self.results_textbox.insert(
-                    "end", f"| Country: {result['country']} ".ljust(30), "cyan"
-                )
-            else:
-                self.results_textbox.insert("end", "| ".ljust(30), "cyan")
-            self.results_textbox.insert("end", f"| {result['proxy']}\n")
-        else:
-            self.results_textbox.insert("end", "Inactive ", "red")
-            self.results_textbox.insert("end", f"| {result['error']}".ljust(48), "red")
-            self.results_textbox.insert("end", f"| {result['proxy']}\n")
-        self.results_textbox.configure(state="disabled")
-        self.results_textbox.see("end")
+        self.remaining_proxies.pop(result["proxy"], None)
+
+        self.result_table.add(result)
 
         self.checked_count += 1
         if self.total_proxies > 0:
             progress = self.checked_count / self.total_proxies
             self.progress_bar.set(progress)
 
-        if self.checked_count == self.total_proxies:
-            self.on_checking_complete()
-
     def log_message(self, message, tag=None):
-        self.results_textbox.configure(state="normal")
+        self.log_textbox.configure(state="normal")
         if tag:
-            self.results_textbox.insert("end", message, tag)
+            self.log_textbox.insert("end", message, tag)
         else:
-            self.results_textbox.insert("end", message)
-        self.results_textbox.configure(state="disabled")
-        self.results_textbox.see("end")
+            self.log_textbox.insert("end", message)
+        excess = int(self.log_textbox.index("end-1c").split(".")[0]) - LOG_LINES
+        if excess > 0:
+            self.log_textbox.delete("1.0", f"{excess + 1}.0")
+        self.log_textbox.configure(state="disabled")
+        self.log_textbox.see("end")
 
     def on_checking_complete(self):
         self.log_message("\n--- All proxies checked. ---\n", "green")
         self.toggle_controls(False)
+        self.close_results_writer()
+        self.run_source = None
 
         self.clear_saved_state()
+        self.clear_input()
+
+    def set_total(self, count):
+        """The run has read its whole input and found `count` valid proxies."""
+        self.total_proxies = count
+        self.loaded_label.configure(text=f"Loaded: {count}")
+        if count:
+            self.progress_bar.set(self.checked_count / count)
+
+    def on_target_reached(self):
+        """Stop early once the requested number of working proxies is found."""
+        self.log_message(
+            f"\n--- Found {self.stop_after} working proxies, stopping. ---\n", "green"
+        )
+        self.toggle_controls(False)
+        self.close_results_writer()
 
-    def update_proxy_textbox(self):
-        """Update the proxy textbox with remaining proxies."""
+        self.restore_remaining()
+
+    def close_results_writer(self):
+        """
+        Flush and close the structured results file and the ranked file, and
+        add the run's outcomes to the check history in the background.
+        """
+        if self.results_writer:
+            try:
+                self.results_writer.close()
+            except Exception as e:
+                self.log_message(f"Error closing {RESULTS_FILE}: {e}\n", "red")
+            finally:
+                self.results_writer = None
+        if self.ranked:
+            try:
+                self.ranked.close()
+            except OSError as e:
+                self.log_message(f"Error writing to {RANKED_FILE}: {e}\n", "red")
+            finally:
+                self.ranked = None
+        if self.history_pending:
+            self.history_pending = False
+            store = self.result_table.store
+            threading.Thread(
+                target=self._update_history,
+                args=(store.iter_outcomes(len(store.active)),),
+            ).start()
+
+    def _update_history(self, outcomes):
         try:
-            self.proxy_textbox.configure(state="normal")
-            self.proxy_textbox.delete("1.0", "end")
-            if self.remaining_proxies:
-                proxy_text = "\n".join(self.remaining_proxies)
-                self.proxy_textbox.insert("1.0", proxy_text)
-            self.proxy_textbox.configure(
-                state="disabled" if self.is_checking else "normal"
-            )
+            update_history(HISTORY_FILE, outcomes)
         except Exception as e:
-            self.log_message(f"Error updating proxy textbox: {e}\n", "red")
+            self.after(
+                0, self.log_message, f"Error updating {HISTORY_FILE}: {e}\n", "red"
+            )
+
+    def start_metrics_server(self):
+        """Expose live metrics and the profiler on localhost."""
+        if METRICS_PORT is None:
+            return
+        try:
+            MetricsServer(port=METRICS_PORT).start()
+        except OSError as e:
+            self.log_message(f"Metrics endpoint unavailable: {e}\n", "yellow")
 
     def save_state(self):
-        """Save current state when stopping midway."""
+        """
+        Save current state when stopping midway: the proxies still being
+        checked, then everything the run had not reached yet. Returns how
+        many proxies were saved.
+        """
+        source = self.run_source
+        self.run_source = None
+        position = source.position if source else None
+        pending = list(self.remaining_proxies)
+        taken = set(pending)
+        temp_file = SAVE_STATE_FILE + ".tmp"
         try:
-            if self.remaining_proxies:
-                with open(SAVE_STATE_FILE, "w") as f:
-                    for proxy in self.remaining_proxies:
-                        f.write(proxy + "\n")
-                self.log_message(
-                    f"State saved: {len(self.remaining_proxies)} proxies remaining.\n",
-                    "cyan",
-                )
+            with open(temp_file, "w", encoding="utf-8") as f:
+                for proxy in pending:
+                    f.write(proxy + "\n")
+                count = len(pending)
+                if source:
+                    count += source.write_rest(f, position, taken)
+            if not count:
+                os.remove(temp_file)
+                self.clear_saved_state()
+                return 0
+            os.replace(temp_file, SAVE_STATE_FILE)
+            self.log_message(f"State saved: {count} proxies remaining.\n", "cyan")
+            return count
         except Exception as e:
             self.log_message(f"Error saving state: {e}\n", "red")
+            return 0
+
+    def restore_remaining(self):
+        """Save what the run did not finish and make it the next input."""
+        if self.save_state():
+            self.load_saved_state()
+        else:
+            self.clear_input()
 
     def load_saved_state(self):
-        """Load saved state on program start."""
+        """
+        Load saved state on program start.
+
+        The file is read on a background thread and inserted a chunk at a
+        time between UI events, so the window shows up at once. A state of
+        more than TEXTBOX_MAX_LINES is imported as a file instead. Starting
+        is disabled until the whole state is in.
+        """
+        if not os.path.exists(SAVE_STATE_FILE):
+            return
+        self.source = None
+        self.loading_state = True
+        self.start_button.configure(state="disabled")
+        chunks = queue.Queue()
+        threading.Thread(
+            target=self._read_saved_state, args=(chunks,), daemon=True
+        ).start()
+        self.after(0, self._insert_saved_state, chunks, 0)
+
+    def _read_saved_state(self, chunks):
+        """Background thread: reads the state file into chunks of lines."""
         try:
-            if os.path.exists(SAVE_STATE_FILE):
-                with open(SAVE_STATE_FILE, "r") as f:
-                    saved_proxies = [
-                        line.strip() for line in f.readlines() if line.strip()
-                    ]
-                if saved_proxies:
-                    self.proxy_textbox.delete("1.0", "end")
-                    proxy_text = "\n".join(saved_proxies)
-                    self.proxy_textbox.insert("1.0", proxy_text)
-                    self.loaded_label.configure(text=f"Loaded: {len(saved_proxies)}")
-                    self.log_message(
-                        f"Loaded saved state: {len(saved_proxies)} proxies.\n", "cyan"
-                    )
+            with open(SAVE_STATE_FILE, "r") as f:
+                head = list(islice(f, TEXTBOX_MAX_LINES + 1))
+                if len(head) > TEXTBOX_MAX_LINES:
+                    chunks.put("import")
+                    return
+                chunk = []
+                for line in head:
+                    line = line.strip()
+                    if line:
+                        chunk.append(line)
+                        if len(chunk) >= STATE_CHUNK_LINES:
+                            chunks.put(chunk)
+                            chunk = []
+                chunks.put(chunk)
+        except Exception as e:
+            chunks.put(e)
+        chunks.put(None)
+
+    def _insert_saved_state(self, chunks, loaded):
+        """Inserts read chunks for up to STATE_INSERT_BUDGET seconds per call."""
+        deadline = perf_counter() + STATE_INSERT_BUDGET
+        while perf_counter() < deadline:
+            try:
+                chunk = chunks.get_nowait()
+            except queue.Empty:
+                break
+            if chunk == "import":
+                self.import_file(SAVE_STATE_FILE, from_state=True)
+                return
+            if isinstance(chunk, Exception):
+                self.log_message(f"Error loading saved state: {chunk}\n", "red")
+                self.on_saved_state_loaded(loaded)
+                return
+            if chunk is None:
+                self.on_saved_state_loaded(loaded)
+                return
+            if not chunk:
+                continue
+            self.proxy_textbox.configure(state="normal")
+            if not loaded:
+                self.proxy_textbox.delete("1.0", "end")
+                self.proxy_textbox.insert("end", "\n".join(chunk))
+            else:
+                self.proxy_textbox.insert("end", "\n" + "\n".join(chunk))
+            self.proxy_textbox.configure(
+                state="disabled" if self.is_checking else "normal"
+            )
+            loaded += len(chunk)
+            self.loaded_label.configure(text=f"Loaded: {loaded}")
+        self.after(10, self._insert_saved_state, chunks, loaded)
+
+    def on_saved_state_loaded(self, count):
+        self.finish_loading()
+        if count:
+            self.log_message(f"Loaded saved state: {count} proxies.\n", "cyan")
+
+    def finish_loading(self):
+        self.loading_state = False
+        if not self.is_checking:
+            self.start_button.configure(state="normal")
+
+    def import_file(self, path=None, from_state=False):
+        """
+        Use a proxy file as the input. Only a preview and the count go into
+        the proxy list; the file itself is streamed into the run.
+        """
+        if path is None:
+            if self.is_checking or self.loading_state:
+                return
+            path = filedialog.askopenfilename(
+                title="Import proxy list",
+                filetypes=[("Text files", "*.txt"), ("All files", "*.*")],
+            )
+            if not path:
+                return
+        self.loading_state = True
+        self.start_button.configure(state="disabled")
+        threading.Thread(
+            target=self._scan_import, args=(path, from_state), daemon=True
+        ).start()
+
+    def _scan_import(self, path, from_state):
+        """Background thread: reads the preview and counts the proxies of a file."""
+        try:
+            preview = read_preview(path)
+            count = count_lines(path)
+        except OSError as e:
+            self.after(0, self._import_failed, path, e, from_state)
+            return
+        self.after(0, self._show_import, path, preview, count, from_state)
+
+    def _import_failed(self, path, error, from_state):
+        self.log_message(f"Error importing {path}: {error}\n", "red")
+        if from_state:
+            self.on_saved_state_loaded(0)
+        else:
+            self.finish_loading()
+
+    def _show_import(self, path, preview, count, from_state):
+        self.source = ProxySource(path=path)
+        self.source_count = count
+        self.proxy_textbox.configure(state="normal")
+        self.proxy_textbox.delete("1.0", "end")
+        self.proxy_textbox.insert("1.0", "\n".join(preview))
+        if count > len(preview):
+            self.proxy_textbox.insert(
+                "end",
+                f"\n... and {count - len(preview)} more from {os.path.basename(path)}",
+            )
+        self.proxy_textbox.configure(state="disabled")
+        self.loaded_label.configure(text=f"Loaded: {count}")
+        if from_state:
+            self.on_saved_state_loaded(count)
+        else:
+            self.log_message(f"Imported {count} proxies from {path}.\n", "cyan")
+            self.finish_loading()
+
+    def clear_input(self):
+        """Empties the proxy list and drops an imported file."""
+        self.source = None
+        self.proxy_textbox.configure(state="normal")
+        self.proxy_textbox.delete("1.0", "end")
+        if self.is_checking:
+            self.proxy_textbox.configure(state="disabled")
+
+    def export_results(self, active):
+        """Stream the working or down proxies of this session to a file."""
+        label = "working" if active else "down"
+        path = filedialog.asksaveasfilename(
+            title=f"Export {label} proxies",
+            defaultextension=".txt",
+            initialfile=f"{label}.txt",
+            filetypes=[("Text files", "*.txt"), ("All files", "*.*")],
+        )
+        if not path:
+            return
+        store = self.result_table.store
+        proxies = store.iter_proxies(active, len(store.active))
+        threading.Thread(
+            target=self._export, args=(proxies, path, label), daemon=True
+        ).start()
+
+    def _export(self, proxies, path, label):
+        """Background thread: writes the exported proxies."""
+        try:
+            count = write_lines(path, proxies)
         except Exception as e:
-            self.log_message(f"Error loading saved state: {e}\n", "red")
+            self.after(0, self.log_message, f"Error exporting to {path}: {e}\n", "red")
+            return
+        self.after(
+            0, self.log_message, f"Exported {count} {label} proxies to {path}.\n", "cyan"
+        )
 
     def clear_saved_state(self):
         """Clear saved state file."""
@@ -564,9 +954,13 @@ class ProxyCheckerApp(ctk.CTk):
             self.log_message(f"Error clearing saved state: {e}\n", "red")
 
     def start_checking(self):
-        proxies_raw = self.proxy_textbox.get("1.0", "end-1c").strip().split("\n")
+        if self.loading_state:
+            return
         self.target_url = self.url_entry.get().strip()
         self.validation_text = self.title_entry.get().strip()
+        self.handshake_only = bool(self.handshake_only_checkbox.get())
+        self.order_mode = self.order_menu.get().lower()
+        stop_after = self.stop_after_entry.get().strip()
 
         if not self.target_url or not self.validation_text:
             self.log_message(
@@ -574,10 +968,27 @@ class ProxyCheckerApp(ctk.CTk):
             )
             return
 
-        proxies_to_check = [self.parse_proxy(p) for p in proxies_raw if p]
-        proxies_to_check = [p for p in proxies_to_check if p is not None]
+        if stop_after and not (stop_after.isdigit() and int(stop_after) > 0):
+            self.log_message(
+                "Error: Stop after must be a positive number of working proxies.\n",
+                "red",
+            )
+            return
+        self.stop_after = int(stop_after) if stop_after else None
+
+        if self.source:
+            source = ProxySource(path=self.source.path)
+            total = self.source_count
+        else:
+            lines = [
+                line.strip()
+                for line in self.proxy_textbox.get("1.0", "end-1c").split("\n")
+                if line.strip()
+            ]
+            total = sum(1 for line in lines if self.parse_proxy(line))
+            source = ProxySource(lines=lines)
 
-        if not proxies_to_check:
+        if not total:
             self.log_message(
                 "Error: No valid proxies found in the input list.\n", "red"
             )
@@ -585,43 +996,161 @@ class ProxyCheckerApp(ctk.CTk):
 
         self.clear_results()
 
-        self.remaining_proxies = [line.strip() for line in proxies_raw if line.strip()]
-        self.total_proxies = len(proxies_to_check)
+        try:
+            self.results_writer = open_writer(RESULTS_FILE)
+        except Exception as e:
+            self.results_writer = None
+            self.log_message(f"Error opening {RESULTS_FILE}: {e}\n", "red")
+        self.history_pending = True
+        try:
+            self.ranked = RankedOutput(
+                RANKED_FILE, TOP_K, bool(self.rank_by_country_checkbox.get())
+            )
+        except OSError as e:
+            self.ranked = None
+            self.log_message(f"Error writing to {RANKED_FILE}: {e}\n", "red")
+
+        self.remaining_proxies = {}
+        self.run_source = source
+        self.total_proxies = total
         self.loaded_label.configure(text=f"Loaded: {self.total_proxies}")
         self.toggle_controls(True)
         self.log_message(f"Starting check on {self.total_proxies} proxies...\n")
 
+        self.run_id += 1
+        self.canceller = Canceller()
+        self.completed = queue.Queue()
+        self.stopping = threading.Event()
+        registry.set_gauge("ui_pending", 0)
         self.checker_thread = threading.Thread(
-            target=self.run_checker_thread, args=(proxies_to_check,)
+            target=self.run_checker_thread,
+            args=(source, self.run_id, self.canceller, self.completed, self.stopping),
         )
         self.checker_thread.daemon = True
         self.checker_thread.start()
 
-    def run_checker_thread(self, proxies):
-        max_workers = min(50, len(proxies))
+    def run_checker_thread(self, source, run_id, canceller, completed, stopping):
+        """
+        Runs one check session. Besides finished checks, `completed` carries
+        ("stop", None) and ("force", None) requests from the main thread.
+        `stopping` is set along with them, so that the connect order, which
+        can keep the thread from reading `completed`, ends early.
+
+        Proxies are read from the source as workers free up, so at most
+        MAX_WORKERS * IN_FLIGHT_PER_WORKER checks are queued at a time. Each
+        proxy read is tracked in remaining_proxies until its result is in.
+        """
+        max_workers = max(1, min(MAX_WORKERS, self.total_proxies))
+        window = max_workers * IN_FLIGHT_PER_WORKER
+        registry.set_gauge("workers_total", max_workers)
+        registry.set_gauge("queue_depth", self.total_proxies)
+        working_found = 0
+        target_reached = False
+        stop_mode = None
+        lines = iter(source)
+
+        def read_proxies():
+            for line in lines:
+                proxy_info = self.parse_proxy(line)
+                if proxy_info:
+                    self.remaining_proxies[line] = None
+                    yield proxy_info
+
+        proxies = read_proxies()
 
         try:
+            if self.order_mode != "input":
+                self.after(
+                    0,
+                    self.log_message,
+                    f"Ordering proxies by '{self.order_mode}'...\n",
+                    "cyan",
+                )
+                proxies = order_proxies(
+                    list(proxies),
+                    self.order_mode,
+                    load_history(HISTORY_FILE),
+                    self.parse_proxy,
+                    stopping.is_set,
+                )
+
             with concurrent.futures.ThreadPoolExecutor(
                 max_workers=max_workers
             ) as executor:
-                self.thread_pool = executor
-                futures = {
-                    executor.submit(
-                        self.check_proxy, p, self.target_url, self.validation_text
-                    )
-                    for p in proxies
-                }
 
-                for future in concurrent.futures.as_completed(futures):
-                    if self.stop_event.is_set():
+                def submit(proxy_info):
+                    future = executor.submit(
+                        canceller.run,
+                        self.check_proxy,
+                        proxy_info,
+                        self.target_url,
+                        self.validation_text,
+                    )
+                    future.add_done_callback(lambda f: completed.put((proxy_info, f)))
+
+                def exhausted(submitted):
+                    if stopping.is_set():
+                        return
+                    registry.add_gauge("queue_depth", submitted - self.total_proxies)
+                    self.after(0, self.run_callback, run_id, self.set_total, submitted)
+
+                scheduler = CheckScheduler(proxies, submit, window, exhausted)
+                stop_deadline = None
+
+                while True:
+                    now = time()
+                    if stop_deadline is None:
+                        timeout = scheduler.fill()
+                        if scheduler.idle and not stopping.is_set():
+                            break
+                    else:
+                        # Stopping: running checks get until the deadline to
+                        # finish, pending retries go back to the saved state.
+                        if not scheduler.outstanding:
+                            break
+                        timeout = stop_deadline - now
+                        if timeout <= 0:
+                            canceller.cancel()
+                            break
 
-                        for f in futures:
-                            f.cancel()
-                        break
+                    try:
+                        proxy_info, future = completed.get(timeout=timeout)
+                    except queue.Empty:
+                        continue
+
+                    if future is None:
+                        stop_mode = proxy_info
+                        scheduler.stop()
+                        executor.shutdown(wait=False, cancel_futures=True)
+                        if stop_mode == "force":
+                            break
+                        stop_deadline = time() + STOP_GRACE
+                        continue
+
+                    scheduler.finish(proxy_info)
                     try:
                         result = future.result()
+                        if scheduler.retry(proxy_info, result):
+                            continue
+
+                        registry.add_gauge("ui_pending", 1)
+                        self.after(
+                            0,
+                            self.run_callback,
+                            run_id,
+                            self.update_ui_with_result,
+                            result,
+                        )
 
-                        self.after(0, self.update_ui_with_result, result)
+                        if result and result["status"] == "Active":
+                            working_found += 1
+                            if self.stop_after and working_found >= self.stop_after:
+                                target_reached = True
+                                executor.shutdown(wait=False, cancel_futures=True)
+                                canceller.cancel()
+                                break
+                    except concurrent.futures.CancelledError:
+                        pass
                     except Exception as e:
                         self.after(
                             0,
@@ -632,81 +1161,78 @@ class ProxyCheckerApp(ctk.CTk):
         except Exception as e:
             self.after(0, self.log_message, f"Error in checker thread: {e}\n", "red")
         finally:
-
-            self.thread_pool = None
-
-            self.after(0, self.on_checking_complete)
+            lines.close()
+            if target_reached:
+                self.after(0, self.run_callback, run_id, self.on_target_reached)
+            elif stop_mode == "stop":
+                self.after(0, self.run_callback, run_id, self._finish_shutdown)
+            elif stop_mode is None:
+                self.after(0, self.run_callback, run_id, self.on_checking_complete)
 
     def stop_checking(self):
+        """
+        Stops submitting new checks and gives the running ones STOP_GRACE
+        seconds to finish before aborting them. Everything unfinished is
+        saved as resumable state.
+        """
         if self.is_checking:
             self.log_message(
-                "\n--- Stopping... waiting for active threads to finish. ---\n",
+                f"\n--- Stopping... giving active checks {STOP_GRACE}s to finish. ---\n",
                 "yellow",
             )
-            self.stop_event.set()
+            self.stop_button.configure(state="disabled")
             self.force_stop_button.configure(state="normal")
-
-            shutdown_thread = threading.Thread(target=self._graceful_shutdown)
-            shutdown_thread.daemon = True
-            shutdown_thread.start()
-
-    def _graceful_shutdown(self):
-        """Handle graceful shutdown of thread pool."""
-        if self.thread_pool:
-            try:
-
-                self.thread_pool.shutdown(wait=True, cancel_futures=True)
-            except:
-                pass
-            finally:
-                self.thread_pool = None
-        self.after(0, self._finish_shutdown)
+            self.stopping.set()
+            self.completed.put(("stop", None))
 
     def _finish_shutdown(self):
         """Finish the shutdown process on the main thread."""
         self.toggle_controls(False)
+        self.close_results_writer()
         self.log_message("--- Checking stopped. ---\n", "yellow")
 
-        if self.remaining_proxies:
-            self.save_state()
+        self.restore_remaining()
 
     def force_stop_checking(self):
-        """Immediately force stop all checking operations."""
+        """Immediately abort all running checks and save what is left."""
         if self.is_checking:
             self.log_message("\n--- Force stopping immediately! ---\n", "red")
-            self.stop_event.set()
-
-            if self.thread_pool:
-                try:
-
-                    self.thread_pool.shutdown(wait=False, cancel_futures=True)
-                except:
-                    pass
-                finally:
-
-                    self.thread_pool = None
+            self.abort_run()
 
             self.toggle_controls(False)
+            self.close_results_writer()
             self.log_message("--- Checking force stopped. ---\n", "red")
 
-            if self.remaining_proxies:
-                self.save_state()
+            self.restore_remaining()
+
+    def abort_run(self):
+        """
+        Aborts the current run: in-flight checks are interrupted, and
+        results still on their way to the UI are dropped, so their proxies
+        stay in the remaining list.
+        """
+        self.stop_event.set()
+        self.stopping.set()
+        self.canceller.cancel()
+        self.completed.put(("force", None))
+        self.run_id += 1
 
     def clear_all(self):
         """Clears both inputs and results."""
-        if self.is_checking:
+        if self.is_checking or self.loading_state:
             return
-        self.proxy_textbox.delete("1.0", "end")
-        self.remaining_proxies = []
+        self.clear_input()
+        self.remaining_proxies = {}
         self.clear_results()
 
         self.clear_saved_state()
 
     def clear_results(self):
         """Clears only the results section."""
-        self.results_textbox.configure(state="normal")
-        self.results_textbox.delete("1.0", "end")
-        self.results_textbox.configure(state="disabled")
+        self.log_textbox.configure(state="normal")
+        self.log_textbox.delete("1.0", "end")
+        self.log_textbox.configure(state="disabled")
+        self.result_table.clear()
         self.working_count = 0
         self.down_count = 0
         self.checked_count = 0
@@ -720,11 +1246,20 @@ class ProxyCheckerApp(ctk.CTk):
         """Enable/disable UI elements based on checking state."""
         self.is_checking = checking
         state = "disabled" if checking else "normal"
-        self.start_button.configure(state=state)
+        self.start_button.configure(
+            state="disabled" if checking or self.loading_state else "normal"
+        )
         self.clear_button.configure(state=state)
-        self.proxy_textbox.configure(state=state)
+        self.import_button.configure(state=state)
+        self.proxy_textbox.configure(
+            state="disabled" if checking or self.source else "normal"
+        )
         self.url_entry.configure(state=state)
         self.title_entry.configure(state=state)
+        self.handshake_only_checkbox.configure(state=state)
+        self.order_menu.configure(state=state)
+        self.stop_after_entry.configure(state=state)
+        self.rank_by_country_checkbox.configure(state=state)
         self.stop_button.configure(state="normal" if checking else "disabled")
         self.force_stop_button.configure(state="disabled")
         if not checking:
@@ -733,16 +1268,7 @@ class ProxyCheckerApp(ctk.CTk):
     def cleanup_threads(self):
         """Clean up all threads before application exit."""
         try:
-
-            self.stop_event.set()
-
-            if self.thread_pool:
-                try:
-                    self.thread_pool.shutdown(wait=False, cancel_futures=True)
-                    self.thread_pool = None
-                except:
-                    pass
-
+            self.abort_run()
         except Exception as e:
             print(f"Error during cleanup: {e}")
 
@@ -750,10 +1276,11 @@ class ProxyCheckerApp(ctk.CTk):
         """Handle application closing."""
         try:
 
-            if self.is_checking and self.remaining_proxies:
+            if self.is_checking:
                 self.save_state()
 
             self.cleanup_threads()
+            self.close_results_writer()
 
         except Exception as e:
             print(f"Error during closing: {e}")
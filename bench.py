@@ -0,0 +1,471 @@
+"""
+Offline benchmark for the proxy checking engines.
+
+Spins up a local farm of fake HTTP/SOCKS4/SOCKS5 proxies plus a local target
+page and geo-IP endpoint in a separate process, then runs each engine against
+it in its own process and reports throughput, latency error, CPU and RSS.
+
+    python bench.py --proxies 500 --latency 50 --failure-rate 0.1
+"""
+import argparse
+import asyncio
+import concurrent.futures
+import contextlib
+import json
+import multiprocessing
+import os
+import random
+import struct
+import subprocess
+import tempfile
+import threading
+import types
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import perf_counter, process_time, time
+from urllib.parse import urlparse
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+FARM_HOST = "127.0.0.1"
+VALIDATION_TEXT = "<title>Google</title>"
+TARGET_PAGE = (
+    "<html><head>" + VALIDATION_TEXT + "</head><body>benchmark</body></html>"
+).encode()
+ENGINES = ["cli", "gui"]
+
+
+class TargetHandler(BaseHTTPRequestHandler):
+    """Serves the validation page and a fake ip-api.com geo endpoint."""
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path.startswith("/json/"):
+            body = json.dumps({"country": "Localhost", "countryCode": "LO"}).encode()
+            content_type = "application/json"
+        else:
+            body = TARGET_PAGE
+            content_type = "text/html"
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TargetServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 512
+
+
+async def pipe(reader, writer):
+    try:
+        while True:
+            data = await reader.read(65536)
+            if not data:
+                break
+            writer.write(data)
+            await writer.drain()
+    except (ConnectionError, asyncio.CancelledError):
+        pass
+    finally:
+        writer.close()
+
+
+async def relay(reader, writer, host, port, initial=b""):
+    try:
+        up_reader, up_writer = await asyncio.open_connection(host, port)
+    except OSError:
+        writer.close()
+        return
+    if initial:
+        up_writer.write(initial)
+    await asyncio.gather(pipe(reader, up_writer), pipe(up_reader, writer))
+
+
+async def handle_http(reader, writer):
+    head = await reader.readuntil(b"\r\n\r\n")
+    method, target = head.split(b" ", 2)[:2]
+    if method == b"CONNECT":
+        host, port = target.decode().rsplit(":", 1)
+        writer.write(b"HTTP/1.1 200 Connection established\r\n\r\n")
+        await relay(reader, writer, host, int(port))
+    else:
+        url = urlparse(target.decode())
+        await relay(reader, writer, url.hostname, url.port or 80, head)
+
+
+async def handle_socks4(reader, writer):
+    version, command, port = struct.unpack(">BBH", await reader.readexactly(4))
+    if version != 4:
+        writer.close()
+        return
+    address = await reader.readexactly(4)
+    await reader.readuntil(b"\x00")
+    if address[:3] == b"\x00\x00\x00" and address[3] != 0:
+        host = (await reader.readuntil(b"\x00"))[:-1].decode()
+    else:
+        host = ".".join(str(b) for b in address)
+    writer.write(b"\x00\x5a" + b"\x00" * 6)
+    await relay(reader, writer, host, port)
+
+
+async def handle_socks5(reader, writer):
+    version, count = await reader.readexactly(2)
+    if version != 5:
+        writer.close()
+        return
+    methods = await reader.readexactly(count)
+    if 0 in methods:
+        writer.write(b"\x05\x00")
+    else:
+        writer.write(b"\x05\x02")
+        _, user_len = await reader.readexactly(2)
+        await reader.readexactly(user_len)
+        (pass_len,) = await reader.readexactly(1)
+        await reader.readexactly(pass_len)
+        writer.write(b"\x01\x00")
+    _, command, _, atyp = await reader.readexactly(4)
+    if atyp == 1:
+        host = ".".join(str(b) for b in await reader.readexactly(4))
+    elif atyp == 3:
+        (length,) = await reader.readexactly(1)
+        host = (await reader.readexactly(length)).decode()
+    else:
+        host = ":".join(
+            (await reader.readexactly(16)).hex()[i : i + 4] for i in range(0, 32, 4)
+        )
+    (port,) = struct.unpack(">H", await reader.readexactly(2))
+    writer.write(b"\x05\x00\x00\x01" + b"\x00" * 6)
+    await relay(reader, writer, host, port)
+
+
+HANDLERS = {"http": handle_http, "socks4": handle_socks4, "socks5": handle_socks5}
+
+
+def make_proxy_handler(spec):
+    handler = HANDLERS[spec["protocol"]]
+
+    async def handle(reader, writer):
+        try:
+            if spec["kind"] == "fail":
+                writer.close()
+                return
+            if spec["kind"] == "blackhole":
+                await reader.read()
+                writer.close()
+                return
+            await asyncio.sleep(spec["latency"] / 1000)
+            await handler(reader, writer)
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError):
+            writer.close()
+        except ConnectionError:
+            pass
+
+    return handle
+
+
+def build_farm(count, protocols, latency, jitter, failure_rate, blackhole_rate, seed):
+    """Returns the spec (protocol, kind, latency) of every fake proxy."""
+    rng = random.Random(seed)
+    specs = []
+    for i in range(count):
+        roll = rng.random()
+        if roll < failure_rate:
+            kind = "fail"
+        elif roll < failure_rate + blackhole_rate:
+            kind = "blackhole"
+        else:
+            kind = "ok"
+        specs.append(
+            {
+                "protocol": protocols[i % len(protocols)],
+                "kind": kind,
+                "latency": max(0, latency + rng.uniform(-jitter, jitter)),
+            }
+        )
+    return specs
+
+
+def run_farm(specs, ready_queue, stop_event):
+    """Farm process entry point: serves the target and every fake proxy."""
+    target = TargetServer((FARM_HOST, 0), TargetHandler)
+    threading.Thread(target=target.serve_forever, daemon=True).start()
+
+    async def serve():
+        servers = []
+        for spec in specs:
+            server = await asyncio.start_server(
+                make_proxy_handler(spec), FARM_HOST, 0, backlog=512
+            )
+            spec["port"] = server.sockets[0].getsockname()[1]
+            servers.append(server)
+        ready_queue.put((target.server_address[1], specs))
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, stop_event.wait)
+        for server in servers:
+            server.close()
+
+    asyncio.run(serve())
+    target.shutdown()
+
+
+def proxy_line(spec, bare=False):
+    if bare:
+        return f"{FARM_HOST}:{spec['port']}"
+    prefix = {"http": "Http", "socks4": "Socks4", "socks5": "Socks5"}
+    return f"({prefix[spec['protocol']]}){FARM_HOST}:{spec['port']}"
+
+
+def run_cli_engine(lines, target_url, geo_url, workdir, timeout, handshake_only):
+    """Runs main.main() end to end on a temporary input file."""
+    import main
+
+    main.INPUT_FILE = os.path.join(workdir, "proxies.txt")
+    main.WORKING_FILE = os.path.join(workdir, "working.txt")
+    main.DOWN_FILE = os.path.join(workdir, "down.txt")
+    main.RESULTS_FILE = os.path.join(workdir, "results.jsonl")
+    main.RANKED_FILE = os.path.join(workdir, "ranked.txt")
+    main.HISTORY_FILE = os.path.join(workdir, "history.jsonl")
+    main.TARGET_URL = target_url
+    main.VALIDATION_TEXT = VALIDATION_TEXT
+    main.GEO_API_URL = geo_url
+    main.REQUEST_TIMEOUT = timeout
+    main.METRICS_PORT = None
+    main.HANDSHAKE_ONLY = handshake_only
+
+    with open(main.INPUT_FILE, "w") as f:
+        f.write("\n".join(lines) + "\n")
+    with open(os.devnull, "w") as devnull:
+        with contextlib.redirect_stdout(devnull), contextlib.redirect_stderr(devnull):
+            main.main()
+    with open(main.RESULTS_FILE) as f:
+        return [json.loads(line) for line in f]
+
+
+def run_gui_engine(lines, target_url, geo_url, workdir, timeout, handshake_only):
+    """
+    Runs ProxyCheckerApp.check_proxy on a thread pool the way
+    run_checker_thread does, without creating a window.
+    """
+    import app
+
+    app.GEO_API_URL = geo_url
+    checker = types.SimpleNamespace(
+        stop_event=threading.Event(), handshake_only=handshake_only
+    )
+    checker.get_country = lambda host: app.ProxyCheckerApp.get_country(checker, host)
+    proxies = [app.ProxyCheckerApp.parse_proxy(checker, line) for line in lines]
+    proxies = [p for p in proxies if p is not None]
+
+    results = []
+    with concurrent.futures.ThreadPoolExecutor(
+        max_workers=min(50, len(proxies))
+    ) as executor:
+        futures = {
+            executor.submit(
+                app.ProxyCheckerApp.check_proxy,
+                checker,
+                p,
+                target_url,
+                VALIDATION_TEXT,
+            )
+            for p in proxies
+        }
+        for future in concurrent.futures.as_completed(futures):
+            result = future.result()
+            if result:
+                results.append(result)
+    return results
+
+
+ENGINE_RUNNERS = {"cli": run_cli_engine, "gui": run_gui_engine}
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if os.uname().sysname == "Darwin" else peak / 1024
+
+
+def run_engine(
+    engine, lines, target_url, geo_url, timeout, handshake_only, result_queue
+):
+    """Engine process entry point: runs one engine and reports its stats."""
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            wall_start, cpu_start = perf_counter(), process_time()
+            results = ENGINE_RUNNERS[engine](
+                lines, target_url, geo_url, workdir, timeout, handshake_only
+            )
+            wall, cpu = perf_counter() - wall_start, process_time() - cpu_start
+        result_queue.put(
+            {
+                "results": [
+                    {k: r.get(k) for k in ("proxy", "status", "ping", "error")}
+                    for r in results
+                ],
+                "wall": wall,
+                "cpu": cpu,
+                "rss_mb": peak_rss_mb(),
+            }
+        )
+    except BaseException as e:
+        result_queue.put({"error": f"{type(e).__name__}: {e}"})
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def summarize(engine, stats, specs_by_line):
+    results = stats["results"]
+    errors = []
+    false_negatives = 0
+    for r in results:
+        spec = specs_by_line.get(r["proxy"])
+        if spec is None:
+            continue
+        if r["status"] == "Active":
+            errors.append(r["ping"] - spec["latency"])
+        elif spec["kind"] == "ok":
+            false_negatives += 1
+    return {
+        "engine": engine,
+        "checked": len(results),
+        "active": len(errors),
+        "false_negatives": false_negatives,
+        "wall_s": round(stats["wall"], 3),
+        "proxies_per_s": round(len(results) / stats["wall"], 1) if stats["wall"] else None,
+        "latency_error_p50_ms": round(percentile(errors, 0.5) or 0, 1),
+        "latency_error_p99_ms": round(percentile(errors, 0.99) or 0, 1),
+        "cpu_s": round(stats["cpu"], 3),
+        "cpu_per_proxy_ms": round(1000 * stats["cpu"] / len(results), 3) if results else None,
+        "peak_rss_mb": round(stats["rss_mb"], 1) if stats["rss_mb"] else None,
+    }
+
+
+def current_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def print_report(reports):
+    columns = [
+        ("engine", "Engine"),
+        ("checked", "Checked"),
+        ("active", "Active"),
+        ("false_negatives", "FalseNeg"),
+        ("proxies_per_s", "Proxies/s"),
+        ("latency_error_p50_ms", "Err p50 ms"),
+        ("latency_error_p99_ms", "Err p99 ms"),
+        ("cpu_per_proxy_ms", "CPU ms/proxy"),
+        ("peak_rss_mb", "Peak RSS MB"),
+    ]
+    print(" | ".join(f"{title:>12}" for _, title in columns))
+    print("-" * (15 * len(columns)))
+    for report in reports:
+        print(" | ".join(f"{str(report.get(key)):>12}" for key, _ in columns))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--proxies", type=int, default=300, help="fake proxies in the farm")
+    parser.add_argument("--protocols", default="http,socks5", help="comma separated mix of http, socks4, socks5")
+    parser.add_argument("--latency", type=float, default=50, help="added proxy latency in ms")
+    parser.add_argument("--jitter", type=float, default=20, help="+/- random latency in ms")
+    parser.add_argument("--failure-rate", type=float, default=0.1, help="share of proxies that drop connections")
+    parser.add_argument("--blackhole-rate", type=float, default=0.02, help="share of proxies that never answer")
+    parser.add_argument("--timeout", type=float, default=3, help="request timeout for the CLI engine")
+    parser.add_argument("--engines", default=",".join(ENGINES), help="comma separated engines to run")
+    parser.add_argument("--handshake-only", action="store_true", help="only run the SOCKS handshake for SOCKS proxies")
+    parser.add_argument("--bare", action="store_true", help="write proxies without a (Type) prefix to exercise protocol detection")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="append the report as a JSON line to this file")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    protocols = args.protocols.split(",")
+    specs = build_farm(
+        args.proxies,
+        protocols,
+        args.latency,
+        args.jitter,
+        args.failure_rate,
+        args.blackhole_rate,
+        args.seed,
+    )
+
+    ctx = multiprocessing.get_context("spawn")
+    ready_queue, stop_event = ctx.Queue(), ctx.Event()
+    farm = ctx.Process(target=run_farm, args=(specs, ready_queue, stop_event), daemon=True)
+    farm.start()
+    target_port, specs = ready_queue.get(timeout=60)
+    target_url = f"http://{FARM_HOST}:{target_port}/"
+    geo_url = f"http://{FARM_HOST}:{target_port}/json"
+    lines = [proxy_line(spec, args.bare) for spec in specs]
+    specs_by_line = dict(zip(lines, specs))
+
+    print(
+        f"Farm: {len(specs)} proxies ({args.protocols}), {args.latency}±{args.jitter} ms, "
+        f"{args.failure_rate:.0%} failing, {args.blackhole_rate:.0%} blackholed"
+    )
+
+    reports = []
+    try:
+        for engine in args.engines.split(","):
+            result_queue = ctx.Queue()
+            process = ctx.Process(
+                target=run_engine,
+                args=(
+                    engine,
+                    lines,
+                    target_url,
+                    geo_url,
+                    args.timeout,
+                    args.handshake_only,
+                    result_queue,
+                ),
+            )
+            process.start()
+            stats = result_queue.get()
+            process.join()
+            if "error" in stats:
+                print(f"Skipping engine '{engine}': {stats['error']}")
+                continue
+            reports.append(summarize(engine, stats, specs_by_line))
+    finally:
+        stop_event.set()
+        farm.join(timeout=5)
+
+    print_report(reports)
+
+    if args.output:
+        with open(args.output, "a") as f:
+            for report in reports:
+                record = dict(report, commit=current_commit(), timestamp=int(time()))
+                record["config"] = vars(args)
+                f.write(json.dumps(record) + "\n")
+
+
+if __name__ == "__main__":
+    main()
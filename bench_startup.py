@@ -0,0 +1,145 @@
+"""
+Startup benchmark for the GUI and the CLI.
+
+Writes a large saved state / input file into a temporary directory, then
+measures from process launch:
+
+  gui window   until the main window is mapped on screen
+  gui state    until the whole saved state is in the proxy list
+  cli start    until main.py announces the start of the check
+
+and fails (exit code 1) when the window or the CLI take longer than their
+budget. The GUI part needs a display.
+
+    python bench_startup.py --lines 1000000
+"""
+
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from time import perf_counter
+
+STATE_LINES = 1_000_000
+WINDOW_BUDGET_MS = 1500
+CLI_BUDGET_MS = 1500
+RUN_TIMEOUT = 300
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def write_proxy_file(path, count):
+    with open(path, "w") as f:
+        for i in range(count):
+            f.write(f"(Http)10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}:8080\n")
+
+
+def gui_child():
+    """Measured process: opens the GUI and reports its startup milestones."""
+    import app
+
+    loaded = app.ProxyCheckerApp.on_saved_state_loaded
+
+    def on_saved_state_loaded(self, count):
+        loaded(self, count)
+        print(f"state {count}", flush=True)
+        self.after(0, self.destroy)
+
+    app.ProxyCheckerApp.on_saved_state_loaded = on_saved_state_loaded
+    app.METRICS_PORT = None
+    window = app.ProxyCheckerApp()
+    window.wait_visibility(window)
+    print("window", flush=True)
+    window.mainloop()
+
+
+def cli_child():
+    """Measured process: runs main.py until it starts checking."""
+    import main
+
+    main.METRICS_PORT = None
+    main.CONSOLE_MODE = "quiet"
+    main.main()
+
+
+def measure(role, workdir, markers):
+    """
+    Launches this script as `role` in workdir and returns the ms from launch
+    to the first output line containing each marker.
+    """
+    env = dict(os.environ, PYTHONUNBUFFERED="1")
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [REPO_DIR, env.get("PYTHONPATH")]))
+    start = perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), "--child", role],
+        cwd=workdir,
+        env=env,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        text=True,
+    )
+    times = {}
+    try:
+        for line in proc.stdout:
+            for marker in markers:
+                if marker not in times and marker in line:
+                    times[marker] = round((perf_counter() - start) * 1000)
+            if len(times) == len(markers) or perf_counter() - start > RUN_TIMEOUT:
+                break
+    finally:
+        proc.kill()
+        proc.wait()
+    return times
+
+
+def report(name, ms, budget=None):
+    if ms is None:
+        print(f"{name:<12} | {'failed':>9}")
+        return False
+    verdict = ""
+    if budget is not None:
+        verdict = "ok" if ms <= budget else f"OVER BUDGET ({budget} ms)"
+    print(f"{name:<12} | {ms:>6} ms | {verdict}")
+    return budget is None or ms <= budget
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--lines", type=int, default=STATE_LINES)
+    parser.add_argument("--window-budget", type=int, default=WINDOW_BUDGET_MS)
+    parser.add_argument("--cli-budget", type=int, default=CLI_BUDGET_MS)
+    parser.add_argument("--skip-gui", action="store_true", help="no display available")
+    parser.add_argument("--child", choices=["gui", "cli"], help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.child == "gui":
+        return gui_child()
+    if args.child == "cli":
+        return cli_child()
+
+    ok = True
+    with tempfile.TemporaryDirectory() as workdir:
+        print(f"Startup with {args.lines} saved/input proxy lines")
+        write_proxy_file(os.path.join(workdir, "proxy_state.txt"), args.lines)
+        shutil.copyfile(
+            os.path.join(workdir, "proxy_state.txt"),
+            os.path.join(workdir, "proxies.txt"),
+        )
+
+        if not args.skip_gui:
+            times = measure("gui", workdir, ["window", "state"])
+            ok &= report("gui window", times.get("window"), args.window_budget)
+            report("gui state", times.get("state"))
+
+        times = measure("cli", workdir, ["Starting check"])
+        ok &= report("cli start", times.get("Starting check"), args.cli_budget)
+
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
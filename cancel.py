@@ -0,0 +1,72 @@
+import socket
+import sys
+import threading
+
+# Thread ident -> Canceller of the check running on that thread.
+_owners = {}
+
+
+class CheckCancelled(ConnectionAbortedError):
+    """Raised when a cancelled check tries to open another connection."""
+
+
+def _audit(event, args):
+    if event == "socket.connect":
+        owner = _owners.get(threading.get_ident())
+        if owner is not None:
+            owner._connecting(args[0])
+
+
+sys.addaudithook(_audit)
+
+
+class Canceller:
+    """
+    Aborts in-flight checks from another thread.
+
+    Checks started through run() have every socket they connect recorded,
+    whichever library opens it (requests/urllib3, PySocks or probe.py), via
+    the "socket.connect" audit event. cancel() shuts those sockets down,
+    which wakes any thread blocked on them at once, and makes every later
+    connect of a check raise CheckCancelled. A blocked check therefore ends
+    within milliseconds instead of when its timeout runs out.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.cancelled = False
+        self.sockets = {}
+
+    def run(self, fn, *args, **kwargs):
+        """Calls fn as a cancellable check, or returns None if already cancelled."""
+        ident = threading.get_ident()
+        with self.lock:
+            if self.cancelled:
+                return None
+            self.sockets[ident] = []
+            _owners[ident] = self
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            with self.lock:
+                del self.sockets[ident]
+                _owners.pop(ident, None)
+
+    def _connecting(self, sock):
+        with self.lock:
+            if self.cancelled:
+                raise CheckCancelled("Check cancelled")
+            self.sockets[threading.get_ident()].append(sock)
+
+    def cancel(self):
+        """Aborts every running check; returns how many were interrupted."""
+        with self.lock:
+            self.cancelled = True
+            running = list(self.sockets.values())
+        for sockets in running:
+            for sock in sockets:
+                try:
+                    sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+        return len(running)
@@ -0,0 +1,258 @@
+import concurrent.futures
+import heapq
+import os
+import random
+import threading
+from time import time
+from colorama import Fore, Style, init
+
+from main import INPUT_FILE, WORKING_FILE, check_proxy, parse_proxy
+from proxy_files import write_atomic
+from server import API_HOST, API_PORT, ProxyServer
+
+POOL_FILE = WORKING_FILE
+SEED_FILES = [WORKING_FILE, INPUT_FILE]
+MAX_WORKERS = 20
+RECHECK_INTERVAL = 300
+RETRY_INTERVAL = 60
+MAX_INTERVAL = 3600
+DEMOTE_AFTER = 2
+DROP_AFTER = 6
+WRITE_INTERVAL = 5
+SERVE_API = True
+
+init(autoreset=True)
+
+
+class ProxyMonitor:
+    """
+    Keeps a live pool of working proxies by re-checking them on a schedule.
+
+    Every known proxy sits in a heap keyed by the time its next check is due.
+    Healthy proxies are re-checked every RECHECK_INTERVAL seconds, failing
+    ones back off exponentially. A proxy is demoted from the pool after
+    DEMOTE_AFTER consecutive failures and forgotten after DROP_AFTER.
+    At most MAX_WORKERS checks are in flight at any time, so CPU and socket
+    usage do not grow with the size of the pool.
+    """
+
+    def __init__(self, pool_file=POOL_FILE, max_workers=MAX_WORKERS):
+        self.pool_file = pool_file
+        self.max_workers = max_workers
+        self.entries = {}
+        self.schedule = []
+        self.sequence = 0
+        self.in_flight = 0
+        self.dirty = False
+        self.last_write = 0
+        self.listeners = []
+        self.lock = threading.RLock()
+        self.wakeup = threading.Condition(self.lock)
+        self.stop_event = threading.Event()
+
+    def add(self, proxy_info, due=None, active=False):
+        """
+        Adds a parsed proxy to the schedule if its endpoint is not already
+        known, whatever protocol prefix the line had. Proxies added as
+        active are in the pool from the start and only leave it after
+        DEMOTE_AFTER failures.
+        """
+        if not proxy_info:
+            return
+        with self.lock:
+            key = (proxy_info["host"], proxy_info["port"], proxy_info["user"])
+            if key in self.entries:
+                return
+            self.entries[key] = {
+                "info": proxy_info,
+                "fails": 0,
+                "active": active,
+                "result": None,
+            }
+            self._schedule(key, time() if due is None else due)
+
+    def load_seed_files(self, paths=SEED_FILES):
+        """
+        Seeds the schedule with every parsable proxy in the given files.
+        Proxies from the pool file start out active, so the pool keeps its
+        known-good proxies while they are checked again.
+        """
+        for path in paths:
+            if not os.path.exists(path):
+                continue
+            active = os.path.abspath(path) == os.path.abspath(self.pool_file)
+            with open(path, "r") as f:
+                for line in f:
+                    if line.strip():
+                        self.add(parse_proxy(line), active=active)
+
+    def add_listener(self, callback):
+        """Registers a callback receiving the active results on every pool change."""
+        self.listeners.append(callback)
+
+    def _schedule(self, key, due):
+        self.sequence += 1
+        heapq.heappush(self.schedule, (due, self.sequence, key))
+        self.wakeup.notify()
+
+    def _next_interval(self, entry):
+        if entry["fails"] == 0:
+            interval = RECHECK_INTERVAL
+        else:
+            interval = min(RETRY_INTERVAL * 2 ** (entry["fails"] - 1), MAX_INTERVAL)
+        return interval * random.uniform(0.9, 1.1)
+
+    def _on_result(self, key, future):
+        try:
+            result = future.result()
+        except Exception:
+            result = None
+
+        with self.lock:
+            self.in_flight -= 1
+            entry = self.entries.get(key)
+            if entry is None:
+                self.wakeup.notify()
+                return
+
+            if result:
+                # Keep what this check found out, so re-checks skip the geo
+                # lookup and the protocol detection (as retries in main.py do).
+                if not result["country"].startswith("N/A"):
+                    entry["info"]["country"] = result["country"]
+                if result["protocol"] != "auto":
+                    entry["info"]["protocol"] = result["protocol"]
+
+            proxy = entry["info"]["original"]
+            if result and result["status"] == "Active":
+                entry["fails"] = 0
+                entry["result"] = result
+                if not entry["active"]:
+                    entry["active"] = True
+                    print(f"{Fore.GREEN}Promoted: {proxy} ({result['ping']} ms)")
+                self.dirty = True
+            else:
+                entry["fails"] += 1
+                if entry["active"] and entry["fails"] >= DEMOTE_AFTER:
+                    entry["active"] = False
+                    self.dirty = True
+                    error = result["error"] if result else "Worker Error"
+                    print(f"{Fore.RED}Demoted: {proxy} ({error})")
+
+            if not entry["active"] and entry["fails"] >= DROP_AFTER:
+                del self.entries[key]
+            else:
+                self._schedule(key, time() + self._next_interval(entry))
+            self.wakeup.notify()
+
+    def _flush_pool(self, force=False):
+        with self.lock:
+            if not self.dirty or (
+                not force and time() - self.last_write < WRITE_INTERVAL
+            ):
+                return
+            results = []
+            unchecked = []
+            for entry in self.entries.values():
+                if entry["active"]:
+                    if entry["result"]:
+                        results.append(entry["result"])
+                    else:
+                        unchecked.append(entry["info"]["original"])
+            self.dirty = False
+            self.last_write = time()
+
+        results.sort(key=lambda r: r["ping"])
+        try:
+            write_atomic(self.pool_file, [r["proxy"] for r in results] + unchecked)
+        except OSError as e:
+            print(f"{Fore.RED}Error writing pool file '{self.pool_file}': {e}")
+        for callback in self.listeners:
+            try:
+                callback(results)
+            except Exception as e:
+                print(f"{Fore.RED}Error in pool listener: {e}")
+
+    def run(self):
+        """Runs the scheduling loop until stop() is called."""
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers=self.max_workers
+        ) as executor:
+            while not self.stop_event.is_set():
+                with self.lock:
+                    now = time()
+                    while (
+                        self.schedule
+                        and self.in_flight < self.max_workers
+                        and self.schedule[0][0] <= now
+                    ):
+                        _, _, key = heapq.heappop(self.schedule)
+                        entry = self.entries.get(key)
+                        if entry is None:
+                            continue
+                        self.in_flight += 1
+                        future = executor.submit(check_proxy, entry["info"])
+                        future.add_done_callback(
+                            lambda f, key=key: self._on_result(key, f)
+                        )
+
+                    if self.in_flight >= self.max_workers or not self.schedule:
+                        timeout = WRITE_INTERVAL
+                    else:
+                        timeout = min(self.schedule[0][0] - now, WRITE_INTERVAL)
+                    if timeout > 0:
+                        self.wakeup.wait(timeout)
+
+                self._flush_pool()
+
+            executor.shutdown(wait=True, cancel_futures=True)
+        self._flush_pool(force=True)
+
+    def stop(self):
+        """Asks the scheduling loop to finish after the checks in flight."""
+        self.stop_event.set()
+        with self.lock:
+            self.wakeup.notify()
+
+
+def main():
+    """
+    Seeds the monitor from the pool and input files and keeps the pool fresh.
+    """
+    monitor = ProxyMonitor()
+    monitor.load_seed_files()
+
+    if not monitor.entries:
+        print(f"{Fore.YELLOW}No proxies found in {', '.join(SEED_FILES)}.")
+        return
+
+    print(
+        f"{Style.BRIGHT}Monitoring {len(monitor.entries)} proxies with {MAX_WORKERS} threads, "
+        f"re-checking every {RECHECK_INTERVAL}s. Press Ctrl+C to stop."
+    )
+    if SERVE_API:
+        try:
+            server = ProxyServer(API_HOST, API_PORT)
+        except OSError as e:
+            print(f"{Fore.RED}Error starting API on {API_HOST}:{API_PORT}: {e}")
+            return
+        monitor.add_listener(server.update)
+        server.start()
+        print(f"Serving the pool on http://{API_HOST}:{API_PORT}/proxy")
+    print("-" * 80)
+
+    runner = threading.Thread(target=monitor.run, daemon=True)
+    runner.start()
+    try:
+        while runner.is_alive():
+            runner.join(timeout=1)
+    except KeyboardInterrupt:
+        print(f"{Fore.YELLOW}Stopping... waiting for active checks to finish.")
+        monitor.stop()
+        runner.join()
+
+    print(f"Pool saved to '{POOL_FILE}'.")
+
+
+if __name__ == "__main__":
+    main()
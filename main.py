@@ -1,28 +1,68 @@
-import requests
 import concurrent.futures
+import itertools
+import queue
 import re
 import socket
+import threading
 from time import time
 from colorama import Fore, Style, init
 from tqdm import tqdm
 
+from cancel import Canceller
+from probe import ProbeError, detect_protocol, socks_handshake, target_address
+from metrics import (
+    MetricsServer,
+    install_profiler_signal,
+    registry,
+    start_snapshot_writer,
+)
+from proxy_files import count_lines
+from ranking import RankedOutput
+from results import open_writer
+from scheduling import (
+    ORDER_MODES,
+    load_history,
+    order_proxies,
+    read_outcomes,
+    update_history,
+)
+from retry import CheckScheduler, classify_exception, classify_response
+
 INPUT_FILE = "proxies.txt"
 WORKING_FILE = "working.txt"
 DOWN_FILE = "down.txt"
+RESULTS_FILE = "results.jsonl"
+HISTORY_FILE = "history.jsonl"
+RANKED_FILE = "ranked.txt"
+TOP_K = 100
+RANK_BY_COUNTRY = False
 TARGET_URL = "https://www.google.com"
 VALIDATION_TEXT = "<title>Google</title>"
+GEO_API_URL = "http://ip-api.com/json"
 REQUEST_TIMEOUT = 10
+HANDSHAKE_ONLY = False
+ORDER_MODE = "input"
+STOP_AFTER = None
 MAX_WORKERS = 50
+IN_FLIGHT_PER_WORKER = 4
+CONSOLE_MODE = "lines"
+CONSOLE_INTERVAL = 5
+METRICS_PORT = 9898
+METRICS_SNAPSHOT_FILE = None
+METRICS_SNAPSHOT_INTERVAL = 10
 
 init(autoreset=True)
 
 
-def parse_proxy(proxy_line):
+def parse_proxy(proxy_line, warn=True):
     """
     Parses a proxy line into a dictionary.
     Handles formats:
     (Type)Host:Port
     (Type)Host:Port:User:Pass
+    Host:Port
+    Host:Port:User:Pass
+    Lines without a type get the protocol "auto" and are detected on check.
     """
     proxy_line = proxy_line.strip()
     if not proxy_line:
@@ -31,17 +71,26 @@ def parse_proxy(proxy_line):
     pattern = re.compile(r"\((\w+)\)([^:]+):(\d+)(?::([^:]+):(.*))?")
     match = pattern.match(proxy_line)
 
-    if not match:
-        print(f"{Fore.YELLOW}Warning: Skipping malformed proxy line: {proxy_line}")
-        return None
-
-    proto, host, port, user, password = match.groups()
-    proto = proto.lower()
-
-    if proto not in ["http", "socks5"]:
-        print(
-            f"{Fore.YELLOW}Warning: Skipping unsupported protocol '{proto}' in line: {proxy_line}"
-        )
+    if match:
+        proto, host, port, user, password = match.groups()
+        proto = proto.lower()
+    else:
+        pattern = re.compile(r"([^:()]+):(\d+)(?::([^:]+):(.*))?$")
+        match = pattern.match(proxy_line)
+        if not match:
+            if warn:
+                print(
+                    f"{Fore.YELLOW}Warning: Skipping malformed proxy line: {proxy_line}"
+                )
+            return None
+        host, port, user, password = match.groups()
+        proto = "auto"
+
+    if proto not in ["http", "socks4", "socks5", "auto"]:
+        if warn:
+            print(
+                f"{Fore.YELLOW}Warning: Skipping unsupported protocol '{proto}' in line: {proxy_line}"
+            )
         return None
 
     return {
@@ -56,29 +105,36 @@ def parse_proxy(proxy_line):
 
 def get_country(host):
     """Gets the country of a host (IP or domain) using a free geo-IP API."""
+    import requests
+
     ip_address = host
     try:
-
-        ip_address = socket.gethostbyname(host)
+        with registry.stage("dns"):
+            ip_address = socket.gethostbyname(host)
     except socket.gaierror:
         return "N/A (DNS Error)"
 
     try:
-
-        response = requests.get(
-            f"http://ip-api.com/json/{ip_address}?fields=country", timeout=5
-        )
-        response.raise_for_status()
-        data = response.json()
-        return data.get("country", "N/A")
+        with registry.stage("geo"):
+            response = requests.get(
+                f"{GEO_API_URL}/{ip_address}?fields=country,countryCode", timeout=5
+            )
+            response.raise_for_status()
+            data = response.json()
+        if "country" not in data:
+            return "N/A"
+        return f"{data['country']} ({data.get('countryCode', 'N/A')})"
     except requests.exceptions.RequestException:
         return "N/A (Geo-IP Error)"
 
 
+@registry.busy_worker()
 def check_proxy(proxy_info):
     """
     Checks a single proxy and returns a dictionary with the results.
     """
+    import requests
+
     if not proxy_info:
         return None
 
@@ -88,132 +144,360 @@ def check_proxy(proxy_info):
     user = proxy_info["user"]
     password = proxy_info["password"]
 
-    if user and password:
-        proxy_url = f"{protocol}://{user}:{password}@{host}:{port}"
-    else:
-        proxy_url = f"{protocol}://{host}:{port}"
-
-    proxies_dict = {"http": proxy_url, "https": proxy_url}
-
     result = {
         "proxy": proxy_info["original"],
+        "protocol": protocol,
         "status": "Inactive",
         "ping": -1,
         "country": "N/A",
         "error": "Unknown",
+        "error_class": None,
+        "attempts": proxy_info.get("attempts", 1),
     }
 
     try:
 
-        result["country"] = get_country(host)
+        if protocol == "auto":
+            with registry.stage("detect"):
+                protocol = detect_protocol(
+                    host, port, *target_address(TARGET_URL), timeout=REQUEST_TIMEOUT
+                )
+            proxy_info = dict(proxy_info, protocol=protocol)
+            result["protocol"] = protocol
 
-        start_time = time()
-        response = requests.get(
-            TARGET_URL,
-            proxies=proxies_dict,
-            timeout=REQUEST_TIMEOUT,
-            headers={
-                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-            },
-        )
-        end_time = time()
+        if user and password:
+            proxy_url = f"{protocol}://{user}:{password}@{host}:{port}"
+        else:
+            proxy_url = f"{protocol}://{host}:{port}"
+
+        proxies_dict = {"http": proxy_url, "https": proxy_url}
 
-        result["ping"] = round((end_time - start_time) * 1000)
+        if protocol in ("socks4", "socks5"):
+            with registry.stage("handshake"):
+                handshake_ms = socks_handshake(
+                    proxy_info, *target_address(TARGET_URL), timeout=REQUEST_TIMEOUT
+                )
 
-        if response.status_code == 200 and VALIDATION_TEXT in response.text:
+        result["country"] = proxy_info.get("country") or get_country(host)
+
+        if HANDSHAKE_ONLY and protocol in ("socks4", "socks5"):
+            result["ping"] = handshake_ms
             result["status"] = "Active"
             result.pop("error", None)
         else:
-            result["error"] = f"Status: {response.status_code}, Validation Failed"
+            start_time = time()
+            with registry.stage("connect"):
+                response = requests.get(
+                    TARGET_URL,
+                    proxies=proxies_dict,
+                    timeout=REQUEST_TIMEOUT,
+                    headers={
+                        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+                    },
+                    stream=True,
+                )
+            with response, registry.stage("validate"):
+                body = response.text
+                end_time = time()
+                valid = response.status_code == 200 and VALIDATION_TEXT in body
+
+            result["ping"] = round((end_time - start_time) * 1000)
+
+            if valid:
+                result["status"] = "Active"
+                result.pop("error", None)
+            else:
+                result["error"] = f"Status: {response.status_code}, Validation Failed"
+                result["error_class"] = classify_response(response.status_code)
+
+    except ProbeError as e:
+        result["error"] = str(e)
+        result["error_class"] = e.error_class
 
     except requests.exceptions.ProxyError as e:
         result["error"] = "Proxy Error"
-    except requests.exceptions.ConnectTimeout:
+        result["error_class"] = classify_exception(e)
+    except requests.exceptions.ConnectTimeout as e:
         result["error"] = "Timeout"
-    except requests.exceptions.ConnectionError:
+        result["error_class"] = classify_exception(e)
+    except requests.exceptions.ConnectionError as e:
         result["error"] = "Connection Error"
+        result["error_class"] = classify_exception(e)
     except requests.exceptions.RequestException as e:
         result["error"] = f"Request Error"
+        result["error_class"] = classify_exception(e)
     except Exception as e:
         result["error"] = "General Error"
+        result["error_class"] = classify_exception(e)
 
+    registry.inc("checks_total", status=result["status"])
+    if result["status"] != "Active":
+        registry.inc("check_errors_total", error=result["error"])
     return result
 
 
+class ConsoleReporter:
+    """
+    Console output for finished checks.
+
+    lines      one colored line per proxy
+    aggregate  one summary line every CONSOLE_INTERVAL seconds
+    quiet      progress bar and final summary only
+    """
+
+    def __init__(self, mode, bar):
+        self.mode = mode
+        self.bar = bar
+        self.start = time()
+        self.next_report = self.start + CONSOLE_INTERVAL
+        self.working = 0
+        self.down = 0
+        self.errors = {}
+
+    def add(self, res):
+        if res["status"] == "Active":
+            self.working += 1
+        else:
+            self.down += 1
+            error_class = res["error_class"] or "unknown"
+            self.errors[error_class] = self.errors.get(error_class, 0) + 1
+
+        if self.mode == "lines":
+            self.print_line(res)
+        elif self.mode == "aggregate" and time() >= self.next_report:
+            self.report()
+
+    def print_line(self, res):
+        if res["status"] == "Active":
+            status_colored = f"{Fore.GREEN}{res['status']:<8}"
+            ping_str = f"{res['ping']} ms"
+
+            print(
+                f"{status_colored} | "
+                f"{Fore.CYAN}Ping: {ping_str:<8} | "
+                f"{Fore.YELLOW}Country: {res['country']:<20} | "
+                f"{Style.BRIGHT}Proxy: {res['proxy']}"
+            )
+        else:
+            status_colored = f"{Fore.RED}{res['status']:<8}"
+
+            print(
+                f"{status_colored} | "
+                f"{Fore.CYAN}Ping: {'N/A':<8} | "
+                f"{Fore.YELLOW}Country: {res['country']:<20} | "
+                f"{Style.BRIGHT}Proxy: {res['proxy']} ({res['error']}, attempts: {res['attempts']})"
+            )
+
+    def report(self):
+        now = time()
+        self.next_report = now + CONSOLE_INTERVAL
+        elapsed = now - self.start
+        checked = self.working + self.down
+        top_errors = sorted(self.errors.items(), key=lambda item: -item[1])[:3]
+        self.bar.write(
+            f"[{elapsed:7.0f}s] checked {checked} ({checked / max(elapsed, 1e-3):.1f}/s) | "
+            f"{Fore.GREEN}working {self.working}{Style.RESET_ALL} | "
+            f"{Fore.RED}down {self.down}{Style.RESET_ALL}"
+            + (
+                " | " + ", ".join(f"{name} {count}" for name, count in top_errors)
+                if top_errors
+                else ""
+            )
+        )
+
+
 def main():
     """
     Main function to read proxies, check them, and save results.
+
+    Input lines are parsed and submitted as workers free up, so only a
+    window of MAX_WORKERS * IN_FLIGHT_PER_WORKER checks and their results
+    is alive at a time, whatever the size of the input file.
     """
+    if CONSOLE_MODE not in ("lines", "aggregate", "quiet"):
+        print(
+            f"{Fore.RED}Error: Unknown CONSOLE_MODE '{CONSOLE_MODE}', "
+            "expected lines, aggregate or quiet."
+        )
+        return
+    if ORDER_MODE not in ORDER_MODES:
+        print(
+            f"{Fore.RED}Error: Unknown ORDER_MODE '{ORDER_MODE}', "
+            f"expected {', '.join(ORDER_MODES)}."
+        )
+        return
+
     try:
-        with open(INPUT_FILE, "r") as f:
-            proxy_lines = f.readlines()
+        input_file = open(INPUT_FILE, "r")
     except FileNotFoundError:
         print(f"{Fore.RED}Error: The input file '{INPUT_FILE}' was not found.")
         return
 
-    parsed_proxies = [parse_proxy(line) for line in proxy_lines]
+    with input_file:
+        skipped = 0
+        warn = CONSOLE_MODE == "lines"
+
+        def read_proxies():
+            nonlocal skipped
+            for line in input_file:
+                proxy_info = parse_proxy(line, warn)
+                if proxy_info:
+                    yield proxy_info
+                elif line.strip():
+                    skipped += 1
+
+        proxies = read_proxies()
+        first = next(proxies, None)
+        if first is None:
+            print(f"{Fore.YELLOW}No valid proxies found in '{INPUT_FILE}'.")
+            return
+        proxies = itertools.chain([first], proxies)
+
+        history = None
+        if ORDER_MODE != "input":
+            proxies = list(proxies)
+            total = len(proxies)
+            print(f"Ordering {total} proxies by '{ORDER_MODE}'...")
+            history = load_history(HISTORY_FILE)
+            proxies = order_proxies(proxies, ORDER_MODE, history, parse_proxy)
+        else:
+            total = count_lines(INPUT_FILE)
 
-    valid_proxies = [p for p in parsed_proxies if p is not None]
+        run_checks(proxies, total, history)
 
-    if not valid_proxies:
-        print(f"{Fore.YELLOW}No valid proxies found in '{INPUT_FILE}'.")
-        return
+    if skipped:
+        print(f"{Fore.YELLOW}Skipped {skipped} malformed or unsupported lines.")
+
+
+def run_checks(proxies, total, history=None):
+    """
+    Checks an iterable of parsed proxies and writes the results. Past
+    results (see scheduling.load_history), when already loaded, also count
+    towards the success rate of the ranked file.
+    """
+    window = MAX_WORKERS * IN_FLIGHT_PER_WORKER
 
     print(
-        f"{Style.BRIGHT}Starting check for {len(valid_proxies)} proxies with {MAX_WORKERS} threads..."
+        f"{Style.BRIGHT}Starting check for {total} proxies with {MAX_WORKERS} threads..."
     )
     print("-" * 80)
 
-    working_count = 0
-    down_count = 0
-
-    with open(WORKING_FILE, "w") as wf, open(DOWN_FILE, "w") as df:
+    if METRICS_PORT is not None:
+        try:
+            MetricsServer(port=METRICS_PORT).start()
+            print(f"Metrics: http://127.0.0.1:{METRICS_PORT}/metrics")
+        except OSError as e:
+            print(f"{Fore.YELLOW}Warning: Metrics endpoint unavailable: {e}")
+    if METRICS_SNAPSHOT_FILE:
+        snapshot_stop = threading.Event()
+        start_snapshot_writer(
+            METRICS_SNAPSHOT_FILE, METRICS_SNAPSHOT_INTERVAL, snapshot_stop
+        )
+    install_profiler_signal()
+    registry.set_gauge("workers_total", MAX_WORKERS)
+    registry.set_gauge("queue_depth", total)
 
-        with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+    try:
+        ranked = RankedOutput(RANKED_FILE, TOP_K, RANK_BY_COUNTRY, history=history)
+    except OSError as e:
+        print(f"{Fore.RED}Error: Cannot write to '{RANKED_FILE}': {e}")
+        return
 
-            future_to_proxy = {
-                executor.submit(check_proxy, proxy_info): proxy_info
-                for proxy_info in valid_proxies
-            }
+    try:
+        results_writer = open_writer(RESULTS_FILE)
+    except (ImportError, ValueError, OSError) as e:
+        print(f"{Fore.RED}Error: Cannot write results to '{RESULTS_FILE}': {e}")
+        return
 
-            for future in tqdm(
-                concurrent.futures.as_completed(future_to_proxy),
-                total=len(valid_proxies),
-                desc="Checking Proxies",
-            ):
+    with open(WORKING_FILE, "w") as wf, open(
+        DOWN_FILE, "w"
+    ) as df, results_writer, ranked:
+
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers=MAX_WORKERS
+        ) as executor, tqdm(total=total, desc="Checking Proxies") as bar:
+
+            console = ConsoleReporter(CONSOLE_MODE, bar)
+            canceller = Canceller()
+            completed = queue.Queue()
+
+            def submit(proxy_info):
+                future = executor.submit(canceller.run, check_proxy, proxy_info)
+                future.add_done_callback(
+                    lambda f: completed.put((proxy_info, f))
+                )
+
+            def abort():
+                executor.shutdown(wait=False, cancel_futures=True)
+                canceller.cancel()
+
+            def exhausted(submitted):
+                if bar.total != submitted:
+                    bar.total = submitted
+                    registry.set_gauge("queue_depth", submitted - bar.n)
+                    bar.refresh()
+
+            scheduler = CheckScheduler(proxies, submit, window, exhausted)
+
+            while True:
+                try:
+                    timeout = scheduler.fill()
+                except KeyboardInterrupt:
+                    abort()
+                    raise
+                if scheduler.idle:
+                    break
+
+                try:
+                    proxy_info, future = completed.get(timeout=timeout)
+                except queue.Empty:
+                    continue
+                except KeyboardInterrupt:
+                    abort()
+                    raise
+                scheduler.finish(proxy_info)
                 res = future.result()
-                if not res:
+                if not res or scheduler.retry(proxy_info, res):
                     continue
 
-                if res["status"] == "Active":
-                    working_count += 1
-                    status_colored = f"{Fore.GREEN}{res['status']:<8}"
-                    ping_str = f"{res['ping']} ms"
-
-                    wf.write(res["proxy"] + "\n")
+                bar.update(1)
+                registry.add_gauge("queue_depth", -1)
+                with registry.stage("write"):
+                    results_writer.write(res)
+                    if res["status"] == "Active":
+                        wf.write(res["proxy"] + "\n")
+                    else:
+                        df.write(res["proxy"] + "\n")
+                    ranked.add(res)
+                console.add(res)
+
+                if STOP_AFTER and console.working >= STOP_AFTER:
                     print(
-                        f"{status_colored} | "
-                        f"{Fore.CYAN}Ping: {ping_str:<8} | "
-                        f"{Fore.YELLOW}Country: {res['country']:<20} | "
-                        f"{Style.BRIGHT}Proxy: {res['proxy']}"
+                        f"{Fore.GREEN}Found {console.working} working proxies, stopping early."
                     )
-                else:
-                    down_count += 1
-                    status_colored = f"{Fore.RED}{res['status']:<8}"
+                    abort()
+                    break
 
-                    df.write(res["proxy"] + "\n")
-                    print(
-                        f"{status_colored} | "
-                        f"{Fore.CYAN}Ping: {'N/A':<8} | "
-                        f"{Fore.YELLOW}Country: {res['country']:<20} | "
-                        f"{Style.BRIGHT}Proxy: {res['proxy']} ({res['error']})"
-                    )
+            if console.mode == "aggregate":
+                console.report()
+
+    if METRICS_SNAPSHOT_FILE:
+        snapshot_stop.set()
+
+    if HISTORY_FILE:
+        try:
+            update_history(HISTORY_FILE, read_outcomes(RESULTS_FILE))
+        except OSError as e:
+            print(f"{Fore.YELLOW}Warning: Cannot update '{HISTORY_FILE}': {e}")
 
     print("-" * 80)
     print(f"{Style.BRIGHT}Check Complete!")
-    print(f"{Fore.GREEN}Total Working: {working_count}")
-    print(f"{Fore.RED}Total Down: {down_count}")
+    print(f"{Fore.GREEN}Total Working: {console.working}")
+    print(f"{Fore.RED}Total Down: {console.down}")
     print(f"Results saved to '{WORKING_FILE}' and '{DOWN_FILE}'.")
+    print(f"Full result records saved to '{RESULTS_FILE}'.")
+    if RANKED_FILE:
+        print(f"Fastest working proxies (top {TOP_K}) saved to '{RANKED_FILE}'.")
 
 
 if __name__ == "__main__":
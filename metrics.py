@@ -0,0 +1,335 @@
+import bisect
+import collections
+import contextlib
+import json
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import perf_counter, sleep, time
+from urllib.parse import parse_qs, urlparse
+
+METRICS_HOST = "127.0.0.1"
+HISTOGRAM_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+PROFILE_INTERVAL = 0.01
+PROFILE_TOP = 25
+
+
+class Histogram:
+    """Cumulative latency histogram in seconds."""
+
+    def __init__(self, buckets=HISTOGRAM_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """
+        Estimates a quantile as the upper bound of the bucket it falls in.
+        None if there are no observations or it lies beyond the last bucket,
+        so snapshots stay valid JSON (no Infinity).
+        """
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return None
+
+
+class Metrics:
+    """
+    Thread-safe registry of counters, gauges and latency histograms.
+
+    Metrics are keyed by name plus a sorted tuple of label pairs, so
+    `inc("checks_total", status="Active")` and
+    `inc("checks_total", status="Inactive")` are two series of one metric.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = collections.defaultdict(float)
+        self.gauges = collections.defaultdict(float)
+        self.histograms = {}
+        self.started = time()
+
+    def inc(self, name, value=1, **labels):
+        with self.lock:
+            self.counters[(name, tuple(sorted(labels.items())))] += value
+
+    def set_gauge(self, name, value, **labels):
+        with self.lock:
+            self.gauges[(name, tuple(sorted(labels.items())))] = value
+
+    def add_gauge(self, name, value, **labels):
+        with self.lock:
+            self.gauges[(name, tuple(sorted(labels.items())))] += value
+
+    def observe(self, name, seconds, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(seconds)
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """
+        Times a pipeline stage (dns, geo, connect, validate, write, ui).
+        Failures are counted per stage and re-raised.
+        """
+        start = perf_counter()
+        try:
+            yield
+        except Exception:
+            self.inc("stage_errors_total", stage=name)
+            raise
+        finally:
+            self.observe("stage_seconds", perf_counter() - start, stage=name)
+
+    @contextlib.contextmanager
+    def busy_worker(self):
+        """Marks a worker thread as busy for the duration of the block."""
+        self.add_gauge("workers_busy", 1)
+        try:
+            yield
+        finally:
+            self.add_gauge("workers_busy", -1)
+
+    def snapshot(self):
+        """Returns all metrics as a JSON-serializable dict."""
+
+        def series(key):
+            name, labels = key
+            if not labels:
+                return name
+            return name + "{" + ",".join(f"{k}={v}" for k, v in labels) + "}"
+
+        with self.lock:
+            data = {
+                "uptime_seconds": round(time() - self.started, 3),
+                "counters": {series(k): v for k, v in self.counters.items()},
+                "gauges": {series(k): v for k, v in self.gauges.items()},
+                "histograms": {
+                    series(k): {
+                        "count": h.count,
+                        "sum": round(h.sum, 6),
+                        "p50": h.quantile(0.5),
+                        "p99": h.quantile(0.99),
+                    }
+                    for k, h in self.histograms.items()
+                },
+            }
+        busy = data["gauges"].get("workers_busy", 0)
+        total = data["gauges"].get("workers_total", 0)
+        if total:
+            data["worker_utilization"] = round(busy / total, 3)
+        return data
+
+    def render_prometheus(self, prefix="proxy_checker_"):
+        """Renders all metrics in the Prometheus text exposition format."""
+
+        def labels_text(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ""
+            return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+        lines = []
+        with self.lock:
+            for kind, values in (("counter", self.counters), ("gauge", self.gauges)):
+                declared = set()
+                for (name, labels), value in sorted(values.items()):
+                    if name not in declared:
+                        lines.append(f"# TYPE {prefix}{name} {kind}")
+                        declared.add(name)
+                    lines.append(f"{prefix}{name}{labels_text(labels)} {value}")
+
+            declared = set()
+            for (name, labels), h in sorted(self.histograms.items()):
+                if name not in declared:
+                    lines.append(f"# TYPE {prefix}{name} histogram")
+                    declared.add(name)
+                cumulative = 0
+                for bound, count in zip(h.buckets, h.counts):
+                    cumulative += count
+                    lines.append(
+                        f"{prefix}{name}_bucket"
+                        f"{labels_text(labels, [('le', bound)])} {cumulative}"
+                    )
+                lines.append(
+                    f"{prefix}{name}_bucket{labels_text(labels, [('le', '+Inf')])} {h.count}"
+                )
+                lines.append(f"{prefix}{name}_sum{labels_text(labels)} {h.sum}")
+                lines.append(f"{prefix}{name}_count{labels_text(labels)} {h.count}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Metrics()
+
+
+class SamplingProfiler:
+    """
+    Low-overhead statistical profiler that can be switched on mid-run.
+
+    A background thread samples the innermost frame of every other thread
+    each PROFILE_INTERVAL seconds and counts where they are, which is enough
+    to see whether workers sit in DNS, SSL, socket reads or the GIL.
+    """
+
+    def __init__(self, interval=PROFILE_INTERVAL):
+        self.interval = interval
+        self.samples = collections.Counter()
+        self.total = 0
+        self.lock = threading.Lock()
+        self.thread = None
+        self.running = threading.Event()
+
+    @property
+    def active(self):
+        return self.running.is_set()
+
+    def start(self):
+        if self.active:
+            return
+        with self.lock:
+            self.samples.clear()
+            self.total = 0
+        self.running.set()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running.clear()
+
+    def toggle(self):
+        if self.active:
+            self.stop()
+        else:
+            self.start()
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while self.running.is_set():
+            with self.lock:
+                for thread_id, frame in sys._current_frames().items():
+                    if thread_id == own_id:
+                        continue
+                    code = frame.f_code
+                    filename = os.path.basename(code.co_filename)
+                    self.samples[f"{filename}:{frame.f_lineno} {code.co_name}"] += 1
+                    self.total += 1
+            sleep(self.interval)
+
+    def report(self, top=PROFILE_TOP):
+        """Returns the most frequently sampled locations as text."""
+        with self.lock:
+            samples = collections.Counter(self.samples)
+            total = self.total
+        if not total:
+            return "No samples collected.\n"
+        lines = [f"{total} samples, {'running' if self.active else 'stopped'}"]
+        for location, count in samples.most_common(top):
+            lines.append(f"{100 * count / total:6.2f}%  {count:>8}  {location}")
+        return "\n".join(lines) + "\n"
+
+
+profiler = SamplingProfiler()
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """
+    GET /metrics       Prometheus text format
+    GET /metrics.json  JSON snapshot
+    GET /profile       profiler report, ?action=start|stop|toggle to control it
+    """
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == "/metrics":
+            self.send_text(
+                registry.render_prometheus(), "text/plain; version=0.0.4; charset=utf-8"
+            )
+        elif url.path == "/metrics.json":
+            self.send_text(json.dumps(registry.snapshot()), "application/json")
+        elif url.path == "/profile":
+            action = parse_qs(url.query).get("action", [None])[-1]
+            if action in ("start", "stop", "toggle"):
+                getattr(profiler, action)()
+            self.send_text(profiler.report())
+        else:
+            self.send_response(404)
+            self.end_headers()
+
+    def send_text(self, text, content_type="text/plain; charset=utf-8"):
+        body = text.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MetricsServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, host=METRICS_HOST, port=0):
+        super().__init__((host, port), MetricsHandler)
+
+    def start(self):
+        """Starts serving on a background thread."""
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return thread
+
+
+def start_snapshot_writer(path, interval, stop_event):
+    """Writes a JSON snapshot to path every `interval` seconds until stop_event is set."""
+
+    def run():
+        while not stop_event.wait(interval):
+            write_snapshot(path)
+        write_snapshot(path)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
+
+
+def write_snapshot(path):
+    tmp_path = path + ".tmp"
+    try:
+        with open(tmp_path, "w") as f:
+            json.dump(registry.snapshot(), f, indent=2)
+        os.replace(tmp_path, path)
+    except OSError:
+        pass
+
+
+def install_profiler_signal():
+    """Toggles the sampling profiler on SIGUSR1 where the platform has it."""
+    import signal
+
+    if not hasattr(signal, "SIGUSR1"):
+        return False
+
+    def handler(signum, frame):
+        profiler.toggle()
+        if not profiler.active:
+            sys.stderr.write(profiler.report())
+
+    signal.signal(signal.SIGUSR1, handler)
+    return True
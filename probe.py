@@ -0,0 +1,319 @@
+import errno
+import ipaddress
+import selectors
+import socket
+import struct
+from time import perf_counter
+from urllib.parse import urlparse
+
+PROBE_TIMEOUT = 5
+
+SOCKS4_REPLIES = {
+    0x5B: "request rejected or failed",
+    0x5C: "identd unreachable",
+    0x5D: "identd user mismatch",
+}
+
+SOCKS5_REPLIES = {
+    0x01: "general failure",
+    0x02: "connection not allowed by ruleset",
+    0x03: "network unreachable",
+    0x04: "host unreachable",
+    0x05: "connection refused by destination",
+    0x06: "TTL expired",
+    0x07: "command not supported",
+    0x08: "address type not supported",
+}
+
+
+class ProbeError(Exception):
+    """A failed handshake, carrying an error class as used by retry.py."""
+
+    def __init__(self, message, error_class):
+        super().__init__(message)
+        self.error_class = error_class
+
+
+class Connection:
+    """
+    Non-blocking TCP connection where every operation shares one deadline.
+
+    Each send or receive waits on a selector for at most the time left until
+    the deadline, so a probe never takes longer than its timeout, however
+    the proxy trickles its bytes.
+    """
+
+    def __init__(self, host, port, timeout=PROBE_TIMEOUT):
+        self.deadline = perf_counter() + timeout
+        self.selector = selectors.DefaultSelector()
+        self.sock = None
+        try:
+            infos = socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)
+        except socket.gaierror as e:
+            raise ProbeError(f"DNS error: {e}", "dns")
+        family, socktype, proto, _, address = infos[0]
+        self.sock = socket.socket(family, socktype, proto)
+        self.sock.setblocking(False)
+        code = self.sock.connect_ex(address)
+        if code not in (0, errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EALREADY):
+            self.close()
+            raise self._socket_error(code)
+        self._wait(selectors.EVENT_WRITE, "connect")
+        code = self.sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+        if code:
+            self.close()
+            raise self._socket_error(code)
+
+    def _socket_error(self, code):
+        if code == errno.ECONNREFUSED:
+            return ProbeError("Connection refused", "refused")
+        message = f"Connect failed: {errno.errorcode.get(code, code)}"
+        if code in (errno.ETIMEDOUT, errno.EHOSTUNREACH, errno.ENETUNREACH):
+            return ProbeError(message, "connect_timeout")
+        return ProbeError(message, "connection_error")
+
+    def _wait(self, event, stage):
+        remaining = self.deadline - perf_counter()
+        if remaining > 0:
+            self.selector.register(self.sock, event)
+            try:
+                ready = self.selector.select(remaining)
+            finally:
+                self.selector.unregister(self.sock)
+            if ready:
+                return
+        self.close()
+        error_class = "connect_timeout" if stage == "connect" else "read_timeout"
+        raise ProbeError(f"Timeout during {stage}", error_class)
+
+    def send_all(self, data):
+        view = memoryview(data)
+        while view:
+            self._wait(selectors.EVENT_WRITE, "send")
+            try:
+                sent = self.sock.send(view)
+            except (BlockingIOError, InterruptedError):
+                continue
+            except OSError as e:
+                self.close()
+                raise ProbeError(f"Send failed: {e}", "reset")
+            view = view[sent:]
+
+    def recv_exact(self, size):
+        chunks = []
+        while size:
+            self._wait(selectors.EVENT_READ, "handshake")
+            try:
+                chunk = self.sock.recv(size)
+            except (BlockingIOError, InterruptedError):
+                continue
+            except OSError as e:
+                self.close()
+                raise ProbeError(f"Receive failed: {e}", "reset")
+            if not chunk:
+                self.close()
+                raise ProbeError("Connection closed during handshake", "reset")
+            chunks.append(chunk)
+            size -= len(chunk)
+        return b"".join(chunks)
+
+    def recv_some(self, size):
+        """
+        Returns up to size bytes as soon as any arrive, or b"" if the peer
+        closes or resets the connection.
+        """
+        while True:
+            self._wait(selectors.EVENT_READ, "handshake")
+            try:
+                return self.sock.recv(size)
+            except (BlockingIOError, InterruptedError):
+                continue
+            except OSError:
+                return b""
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+        self.selector.close()
+
+
+def _ipv4(host):
+    try:
+        return ipaddress.IPv4Address(host).packed
+    except ValueError:
+        return None
+
+
+def socks4_handshake(conn, dest_host, dest_port, user_id=None):
+    """
+    SOCKS4 CONNECT to an IPv4 dest_host, or SOCKS4a when dest_host is a
+    hostname so the proxy resolves it.
+    """
+    address = _ipv4(dest_host)
+    request = struct.pack(">BBH", 4, 1, dest_port)
+    request += address or b"\x00\x00\x00\x01"
+    request += (user_id or "").encode() + b"\x00"
+    if address is None:
+        request += dest_host.encode("idna") + b"\x00"
+    conn.send_all(request)
+
+    version, status = conn.recv_exact(8)[:2]
+    if version != 0:
+        raise ProbeError("Not a SOCKS4 proxy", "proxy_error")
+    if status != 0x5A:
+        raise ProbeError(
+            f"SOCKS4 {SOCKS4_REPLIES.get(status, f'error {status:#x}')}", "proxy_error"
+        )
+
+
+def socks5_handshake(conn, dest_host, dest_port, user=None, password=None):
+    """SOCKS5 CONNECT with optional username/password authentication (RFC 1929)."""
+    methods = b"\x00\x02" if user and password else b"\x00"
+    conn.send_all(bytes([5, len(methods)]) + methods)
+
+    version, method = conn.recv_exact(2)
+    if version != 5:
+        raise ProbeError("Not a SOCKS5 proxy", "proxy_error")
+    if method == 0x02:
+        if not (user and password):
+            raise ProbeError("SOCKS5 proxy requires authentication", "proxy_auth")
+        user_bytes, password_bytes = user.encode(), password.encode()
+        conn.send_all(
+            bytes([1, len(user_bytes)])
+            + user_bytes
+            + bytes([len(password_bytes)])
+            + password_bytes
+        )
+        if conn.recv_exact(2)[1] != 0:
+            raise ProbeError("SOCKS5 authentication failed", "proxy_auth")
+    elif method != 0x00:
+        raise ProbeError("SOCKS5 proxy accepts none of our auth methods", "proxy_auth")
+
+    try:
+        ip = ipaddress.ip_address(dest_host)
+        address = bytes([1 if ip.version == 4 else 4]) + ip.packed
+    except ValueError:
+        host_bytes = dest_host.encode("idna")
+        address = bytes([3, len(host_bytes)]) + host_bytes
+    conn.send_all(b"\x05\x01\x00" + address + struct.pack(">H", dest_port))
+
+    version, reply, _, atyp = conn.recv_exact(4)
+    if version != 5:
+        raise ProbeError("Invalid SOCKS5 reply", "proxy_error")
+    if reply != 0:
+        raise ProbeError(
+            f"SOCKS5 {SOCKS5_REPLIES.get(reply, f'error {reply:#x}')}", "proxy_error"
+        )
+    if atyp == 1:
+        conn.recv_exact(4 + 2)
+    elif atyp == 4:
+        conn.recv_exact(16 + 2)
+    elif atyp == 3:
+        conn.recv_exact(conn.recv_exact(1)[0] + 2)
+
+
+def target_address(url):
+    """Returns the (host, port) a request to url would CONNECT to."""
+    parsed = urlparse(url)
+    default_port = 443 if parsed.scheme == "https" else 80
+    return parsed.hostname, parsed.port or default_port
+
+
+def resolve(host, family=socket.AF_UNSPEC):
+    """Resolves host locally to an IP address string, raises ProbeError on failure."""
+    try:
+        return socket.getaddrinfo(host, None, family, socket.SOCK_STREAM)[0][4][0]
+    except (socket.gaierror, IndexError) as e:
+        raise ProbeError(f"DNS error: {e}", "dns")
+
+
+def socks_handshake(
+    proxy_info, dest_host, dest_port, timeout=PROBE_TIMEOUT, remote_dns=False
+):
+    """
+    Opens a SOCKS tunnel to dest_host:dest_port through the proxy and closes
+    it again. Returns the handshake time in ms, raises ProbeError on failure.
+
+    Like the socks4:// and socks5:// validation request, dest_host is
+    resolved locally and the proxy gets an IP address. With remote_dns the
+    proxy gets the hostname instead (SOCKS4a, SOCKS5 domain address).
+    """
+    start = perf_counter()
+    if not remote_dns:
+        family = socket.AF_INET if proxy_info["protocol"] == "socks4" else 0
+        dest_host = resolve(dest_host, family)
+    conn = Connection(proxy_info["host"], proxy_info["port"], timeout)
+    try:
+        if proxy_info["protocol"] == "socks4":
+            socks4_handshake(conn, dest_host, dest_port, proxy_info.get("user"))
+        else:
+            socks5_handshake(
+                conn,
+                dest_host,
+                dest_port,
+                proxy_info.get("user"),
+                proxy_info.get("password"),
+            )
+    finally:
+        conn.close()
+    return round((perf_counter() - start) * 1000)
+
+
+# A valid SOCKS5 greeting offering seven methods (including no-auth and
+# username/password) that is also long enough, and NUL-terminated, to read
+# as a complete SOCKS4 request. SOCKS4-only servers then reject it instead of
+# waiting for more bytes.
+SOCKS5_DETECT_GREETING = b"\x05\x07\x02\x01\x03\x04\x80\x81\x00"
+
+
+def _first_reply(host, port, request, deadline):
+    conn = Connection(host, port, deadline - perf_counter())
+    try:
+        conn.send_all(request)
+        return conn.recv_some(16)
+    except ProbeError as e:
+        if e.error_class == "reset":
+            return b""
+        raise
+    finally:
+        conn.close()
+
+
+def _classify_reply(reply):
+    if reply.startswith(b"HTTP/"):
+        return "http"
+    if reply[:1] == b"\x05":
+        return "socks5"
+    if len(reply) >= 2 and reply[0] == 0 and 0x5A <= reply[1] <= 0x5D:
+        return "socks4"
+    return None
+
+
+def detect_protocol(host, port, dest_host, dest_port, timeout=PROBE_TIMEOUT):
+    """
+    Detects whether host:port speaks HTTP, SOCKS5 or SOCKS4 with at most
+    three short-lived connections sharing one deadline.
+
+    An HTTP CONNECT goes first because HTTP proxies wait for a full request
+    line, while SOCKS servers drop a connection whose first byte is not
+    their version number right away. A SOCKS5 greeting and a SOCKS4 CONNECT
+    follow only if the previous probe was refused that way. Any reply is
+    matched against all three protocols, since some servers answer a
+    foreign greeting in their own protocol.
+    """
+    deadline = perf_counter() + timeout
+    probes = [
+        (
+            f"CONNECT {dest_host}:{dest_port} HTTP/1.1\r\n"
+            f"Host: {dest_host}:{dest_port}\r\n\r\n"
+        ).encode(),
+        SOCKS5_DETECT_GREETING,
+        struct.pack(">BBH", 4, 1, dest_port) + b"\x00\x00\x00\x01\x00"
+        + dest_host.encode("idna") + b"\x00",
+    ]
+    for request in probes:
+        protocol = _classify_reply(_first_reply(host, port, request, deadline))
+        if protocol:
+            return protocol
+    raise ProbeError("Unknown proxy protocol", "unknown_protocol")
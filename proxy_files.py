@@ -0,0 +1,147 @@
+import io
+import mmap
+import os
+import stat
+import tempfile
+from itertools import islice
+
+MMAP_THRESHOLD = 16 * 1024 * 1024
+PREVIEW_LINES = 200
+WRITE_CHUNK_LINES = 10000
+
+# os.umask can only be read by setting it, so read it once at import.
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+def count_lines(path):
+    """Counts the non-blank lines of a file without decoding it."""
+    with open(path, "rb") as f:
+        return sum(1 for line in f if line.strip())
+
+
+def _raw_lines(path, offset=0):
+    """
+    Yields (line, offset after the line) from byte offset on. Files of
+    MMAP_THRESHOLD bytes or more are memory-mapped rather than read.
+    """
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        if size - offset >= MMAP_THRESHOLD:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                mm.seek(offset)
+                for line in iter(mm.readline, b""):
+                    yield line, mm.tell()
+        else:
+            f.seek(offset)
+            for line in iter(f.readline, b""):
+                yield line, f.tell()
+
+
+def read_preview(path, limit=PREVIEW_LINES):
+    """Returns the first `limit` non-blank lines of a file."""
+    lines = (raw.decode("utf-8", "replace").strip() for raw, _ in _raw_lines(path))
+    return list(islice((line for line in lines if line), limit))
+
+
+def write_lines(path, lines):
+    """Writes lines to path in chunks without building the whole text."""
+    count = 0
+    lines = iter(lines)
+    with open(path, "w", encoding="utf-8") as f:
+        while True:
+            chunk = list(islice(lines, WRITE_CHUNK_LINES))
+            if not chunk:
+                return count
+            f.write("\n".join(chunk) + "\n")
+            count += len(chunk)
+
+
+def write_atomic(path, lines):
+    """
+    Writes lines to path so readers only ever see the old or the new file.
+    The data goes to a temporary file in the same directory which is then
+    renamed over the target. The file keeps the permissions of the target,
+    or gets the umask default when it is new, rather than mkstemp's 0600.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    try:
+        mode = stat.S_IMODE(os.stat(path).st_mode)
+    except FileNotFoundError:
+        mode = 0o666 & ~_UMASK
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=".txt")
+    try:
+        with os.fdopen(fd, "w") as f:
+            for line in lines:
+                f.write(line + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp_path, mode)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+class ProxySource:
+    """
+    Proxy lines for a check run, from a file or a list.
+
+    Lines are handed out one at a time, and `position` only moves past a
+    line once the next one is asked for. So everything from `position` on
+    has either not been handed out yet or is still being taken in, and
+    write_rest() can save an interrupted run without the list in memory,
+    given the lines already taken in so the one at `position` is not saved
+    twice.
+    """
+
+    def __init__(self, path=None, lines=None):
+        self.path = path
+        self.lines = lines
+        self.position = 0
+
+    def __iter__(self):
+        if self.path is None:
+            while self.position < len(self.lines):
+                yield self.lines[self.position]
+                self.position += 1
+            return
+        for raw, end in _raw_lines(self.path, self.position):
+            line = raw.decode("utf-8", "replace").strip()
+            if line:
+                yield line
+            self.position = end
+
+    def _rest(self, position):
+        if self.path is None:
+            yield from islice(self.lines, position, None)
+            return
+        with open(self.path, "rb") as raw:
+            raw.seek(position)
+            for line in io.TextIOWrapper(raw, encoding="utf-8", errors="replace"):
+                line = line.strip()
+                if line:
+                    yield line
+
+    def write_rest(self, f, position=None, taken=()):
+        """
+        Writes the lines from position (default: now) on to f; returns how
+        many. The line at position may already have been handed out, so it
+        is left out if it is in `taken` (the lines the caller still tracks).
+        """
+        position = self.position if position is None else position
+        lines = self._rest(position)
+        first = next(lines, None)
+        if first is None:
+            return 0
+        count = 0
+        if first not in taken:
+            f.write(first + "\n")
+            count += 1
+        for line in lines:
+            f.write(line + "\n")
+            count += 1
+        return count
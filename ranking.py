@@ -0,0 +1,119 @@
+import heapq
+from itertools import count
+from time import time
+
+from proxy_files import write_atomic
+
+RANKED_FILE = "ranked.txt"
+TOP_K = 100
+RANK_INTERVAL = 2.0
+
+
+def rank_cost(result, history=None):
+    """
+    Expected latency per successful check: the measured ping divided by
+    the success rate over this check's attempts and any past results
+    (history as returned by scheduling.load_history). Lower is better.
+    """
+    successes, checks = (history or {}).get(result["proxy"], (0, 0))
+    rate = (successes + 1) / (checks + result.get("attempts", 1))
+    return result["ping"] / rate
+
+
+class TopK:
+    """
+    The k lowest-cost proxies seen so far, in a bounded max-heap: each
+    result costs O(log k) and memory stays at k entries, however many
+    results go through.
+    """
+
+    def __init__(self, k):
+        self.k = k
+        self.heap = []
+        self.members = set()
+        self.sequence = count()
+
+    def push(self, cost, proxy):
+        """Offers a proxy; returns True if it made it into the top k."""
+        if proxy in self.members:
+            return False
+        entry = (-cost, next(self.sequence), proxy)
+        if len(self.heap) < self.k:
+            heapq.heappush(self.heap, entry)
+        elif cost < -self.heap[0][0]:
+            _, _, evicted = heapq.heapreplace(self.heap, entry)
+            self.members.discard(evicted)
+        else:
+            return False
+        self.members.add(proxy)
+        return True
+
+    def ranked(self):
+        """Returns [(cost, proxy)] best first."""
+        return sorted((-cost, proxy) for cost, _, proxy in self.heap)
+
+
+class RankedOutput:
+    """
+    Keeps the best k working proxies of a run, overall or per country, and
+    rewrites the ranked file while the run goes on.
+
+    The file is replaced atomically at most every `interval` seconds and
+    only when the top k changed, so the best proxies found so far can be
+    used mid-run without sorting the full results afterwards. With
+    per_country the file lists each country's top k, best country first.
+    A path of None turns the ranking off.
+    """
+
+    def __init__(
+        self,
+        path=RANKED_FILE,
+        k=TOP_K,
+        per_country=False,
+        interval=RANK_INTERVAL,
+        history=None,
+    ):
+        self.path = path
+        self.k = k
+        self.per_country = per_country
+        self.interval = interval
+        self.history = history
+        self.groups = {}
+        self.dirty = False
+        self.next_write = time() + interval
+        if path is not None:
+            # Like working.txt, start every run from an empty file.
+            write_atomic(path, [])
+
+    def add(self, result):
+        if self.path is None or result["status"] != "Active":
+            return
+        group = result["country"] if self.per_country else None
+        top = self.groups.get(group)
+        if top is None:
+            top = self.groups[group] = TopK(self.k)
+        if top.push(rank_cost(result, self.history), result["proxy"]):
+            self.dirty = True
+        if self.dirty and time() >= self.next_write:
+            self.flush()
+
+    def lines(self):
+        groups = [top.ranked() for top in self.groups.values()]
+        groups.sort(key=lambda ranked: ranked[0][0])
+        return [proxy for ranked in groups for _, proxy in ranked]
+
+    def flush(self):
+        """Writes the ranked file now if the ranking changed since the last write."""
+        if self.dirty:
+            write_atomic(self.path, self.lines())
+            self.dirty = False
+        self.next_write = time() + self.interval
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,308 @@
+import bisect
+import tkinter.font
+from array import array
+
+import customtkinter as ctk
+
+REFRESH_MS = 100
+STATUS_FILTERS = ["All", "Active", "Inactive"]
+SORT_ORDERS = {
+    "Check order": None,
+    "Ping (fastest)": "ping_asc",
+    "Ping (slowest)": "ping_desc",
+}
+ALL = "All"
+
+# Sort key of inactive rows, so they end up last in both ping orders.
+_LAST = 2**62
+
+
+class ResultStore:
+    """
+    Finished results kept column by column.
+
+    Status, ping, country and error live in compact arrays, with countries
+    and errors interned to small ids, so a million rows cost little more
+    than their proxy strings. Rows are addressed by their index in check
+    order.
+    """
+
+    def __init__(self):
+        self.proxies = []
+        self.active = bytearray()
+        self.pings = array("i")
+        self.countries = array("I")
+        self.errors = array("I")
+        self.country_names = []
+        self.error_names = []
+        self._country_ids = {}
+        self._error_ids = {}
+
+    def __len__(self):
+        return len(self.proxies)
+
+    def _intern(self, value, names, ids):
+        index = ids.get(value)
+        if index is None:
+            index = ids[value] = len(names)
+            names.append(value)
+        return index
+
+    def append(self, result):
+        """Adds a result dictionary and returns its row index."""
+        active = result["status"] == "Active"
+        self.proxies.append(result["proxy"])
+        self.active.append(active)
+        self.pings.append(result["ping"])
+        self.countries.append(
+            self._intern(result["country"], self.country_names, self._country_ids)
+        )
+        self.errors.append(
+            self._intern(
+                "" if active else result.get("error") or "",
+                self.error_names,
+                self._error_ids,
+            )
+        )
+        return len(self.proxies) - 1
+
+    def row(self, index):
+        return {
+            "proxy": self.proxies[index],
+            "status": "Active" if self.active[index] else "Inactive",
+            "ping": self.pings[index],
+            "country": self.country_names[self.countries[index]],
+            "error": self.error_names[self.errors[index]],
+        }
+
+    def iter_proxies(self, active, count):
+        """
+        Yields the working (or down) proxies among the first `count` rows.
+        Take `count` from len(self.active) on the thread that appends, since
+        `append` extends `proxies` first.
+        """
+        for index in range(count):
+            if self.active[index] == active:
+                yield self.proxies[index]
+
+    def iter_outcomes(self, count):
+        """Yields (proxy, active) for the first `count` rows."""
+        for index in range(count):
+            yield self.proxies[index], bool(self.active[index])
+
+    def matches(self, index, status=None, country=None):
+        if status is not None and self.active[index] != (status == "Active"):
+            return False
+        if country is not None and self.countries[index] != self._country_ids.get(
+            country
+        ):
+            return False
+        return True
+
+    def sort_key(self, index, order):
+        if not self.active[index]:
+            return _LAST
+        return self.pings[index] if order == "ping_asc" else -self.pings[index]
+
+    def select(self, status=None, country=None, order=None):
+        """
+        Returns the matching row indices as an array, in check order or
+        sorted by ping ("ping_asc" / "ping_desc", inactive rows last).
+        """
+        rows = array(
+            "I", (i for i in range(len(self)) if self.matches(i, status, country))
+        )
+        if order:
+            rows = array("I", sorted(rows, key=lambda i: self.sort_key(i, order)))
+        return rows
+
+
+class ResultTable(ctk.CTkFrame):
+    """
+    Result list that only ever renders the rows on screen.
+
+    The rows of the current filter and sort are kept as an index array into
+    a ResultStore. New results are slotted into that array as they arrive,
+    and redraws are throttled to one every REFRESH_MS, so the cost of a
+    redraw does not grow with the number of results.
+    """
+
+    def __init__(self, master, **kwargs):
+        super().__init__(master, **kwargs)
+        self.grid_columnconfigure(0, weight=1)
+        self.grid_rowconfigure(1, weight=1)
+
+        self.store = ResultStore()
+        self.view = array("I")
+        self.view_keys = array("q")
+        self.status = None
+        self.country = None
+        self.order = None
+        self.offset = 0
+        self.follow = True
+        self.refresh_pending = False
+        self.known_countries = 0
+
+        filters = ctk.CTkFrame(self, fg_color="transparent")
+        filters.grid(row=0, column=0, columnspan=2, pady=(0, 5), sticky="ew")
+        filters.grid_columnconfigure(6, weight=1)
+
+        ctk.CTkLabel(filters, text="Status:").grid(row=0, column=0, padx=(5, 5))
+        self.status_menu = ctk.CTkOptionMenu(
+            filters, values=STATUS_FILTERS, width=100, command=self.on_filter_change
+        )
+        self.status_menu.grid(row=0, column=1, padx=(0, 15))
+
+        ctk.CTkLabel(filters, text="Country:").grid(row=0, column=2, padx=(0, 5))
+        self.country_menu = ctk.CTkOptionMenu(
+            filters, values=[ALL], width=170, command=self.on_filter_change
+        )
+        self.country_menu.grid(row=0, column=3, padx=(0, 15))
+
+        ctk.CTkLabel(filters, text="Sort:").grid(row=0, column=4, padx=(0, 5))
+        self.sort_menu = ctk.CTkOptionMenu(
+            filters,
+            values=list(SORT_ORDERS),
+            width=130,
+            command=self.on_filter_change,
+        )
+        self.sort_menu.grid(row=0, column=5, padx=(0, 15))
+
+        self.count_label = ctk.CTkLabel(filters, text="")
+        self.count_label.grid(row=0, column=6, padx=5, sticky="e")
+
+        self.textbox = ctk.CTkTextbox(
+            self,
+            state="disabled",
+            text_color="white",
+            wrap="none",
+            activate_scrollbars=False,
+        )
+        self.textbox.grid(row=1, column=0, sticky="nsew")
+        self.textbox.tag_config("green", foreground="#66BB6A")
+        self.textbox.tag_config("red", foreground="#EF5350")
+        self.textbox.tag_config("yellow", foreground="#FFEE58")
+        self.textbox.tag_config("cyan", foreground="#26C6DA")
+
+        self.scrollbar = ctk.CTkScrollbar(self, command=self.on_scrollbar)
+        self.scrollbar.grid(row=1, column=1, sticky="ns")
+
+        inner = self.textbox._textbox
+        self.line_height = tkinter.font.Font(font=inner.cget("font")).metrics(
+            "linespace"
+        )
+        for sequence in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+            inner.bind(sequence, self.on_mouse_wheel)
+        self.textbox.bind("<Configure>", lambda event: self.schedule_refresh())
+
+    def visible_rows(self):
+        return max(1, self.textbox.winfo_height() // self.line_height)
+
+    def max_offset(self):
+        return max(0, len(self.view) - self.visible_rows())
+
+    def add(self, result):
+        """Stores a result and slots it into the current view."""
+        index = self.store.append(result)
+        if self.store.matches(index, self.status, self.country):
+            if self.order:
+                key = self.store.sort_key(index, self.order)
+                position = bisect.bisect_right(self.view_keys, key)
+                self.view_keys.insert(position, key)
+                self.view.insert(position, index)
+            else:
+                self.view.append(index)
+        self.schedule_refresh()
+
+    def clear(self):
+        self.store = ResultStore()
+        self.known_countries = 0
+        self.country_menu.configure(values=[ALL])
+        self.country_menu.set(ALL)
+        self.country = None
+        self.rebuild_view()
+
+    def on_filter_change(self, _value=None):
+        status = self.status_menu.get()
+        country = self.country_menu.get()
+        self.status = None if status == ALL else status
+        self.country = None if country == ALL else country
+        self.order = SORT_ORDERS[self.sort_menu.get()]
+        self.rebuild_view()
+
+    def rebuild_view(self):
+        self.view = self.store.select(self.status, self.country, self.order)
+        self.view_keys = array("q")
+        if self.order:
+            self.view_keys.extend(self.store.sort_key(i, self.order) for i in self.view)
+        self.offset = 0
+        self.follow = not self.order
+        self.schedule_refresh()
+
+    def on_scrollbar(self, action, amount, unit=None):
+        if action == "moveto":
+            self.scroll_to(round(float(amount) * len(self.view)))
+        elif unit == "pages":
+            self.scroll_to(self.offset + int(amount) * self.visible_rows())
+        else:
+            self.scroll_to(self.offset + int(amount))
+
+    def on_mouse_wheel(self, event):
+        if event.num == 4 or event.delta > 0:
+            self.scroll_to(self.offset - 3)
+        else:
+            self.scroll_to(self.offset + 3)
+        return "break"
+
+    def scroll_to(self, offset):
+        self.offset = min(max(0, offset), self.max_offset())
+        self.follow = self.offset >= self.max_offset()
+        self.refresh()
+
+    def schedule_refresh(self):
+        if not self.refresh_pending:
+            self.refresh_pending = True
+            self.after(REFRESH_MS, self.refresh)
+
+    def refresh(self):
+        """Redraws the visible rows, the scrollbar and the filter choices."""
+        self.refresh_pending = False
+        if self.follow:
+            self.offset = self.max_offset()
+
+        if len(self.store.country_names) != self.known_countries:
+            self.known_countries = len(self.store.country_names)
+            self.country_menu.configure(
+                values=[ALL] + sorted(self.store.country_names)
+            )
+
+        rows = self.view[self.offset : self.offset + self.visible_rows()]
+        self.textbox.configure(state="normal")
+        self.textbox.delete("1.0", "end")
+        for index in rows:
+            self.insert_row(self.store.row(index))
+        self.textbox.configure(state="disabled")
+
+        total = len(self.view)
+        if total:
+            self.scrollbar.set(self.offset / total, (self.offset + len(rows)) / total)
+        else:
+            self.scrollbar.set(0, 1)
+        self.count_label.configure(text=f"Showing {total} of {len(self.store)}")
+
+    def insert_row(self, row):
+        if row["status"] == "Active":
+            self.textbox.insert("end", "Active   ", "green")
+            self.textbox.insert("end", f"| Ping: {row['ping']}ms ".ljust(15), "yellow")
+
+            if row["country"] != "N/A":
+                self.textbox.insert(
+                    "end", f"| Country: {row['country']} ".ljust(30), "cyan"
+                )
+            else:
+                self.textbox.insert("end", "| ".ljust(30), "cyan")
+            self.textbox.insert("end", f"| {row['proxy']}\n")
+        else:
+            self.textbox.insert("end", "Inactive ", "red")
+            self.textbox.insert("end", f"| {row['error']}".ljust(48), "red")
+            self.textbox.insert("end", f"| {row['proxy']}\n")
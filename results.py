@@ -0,0 +1,165 @@
+import csv
+import json
+import os
+from time import time
+
+RESULT_FIELDS = [
+    "proxy",
+    "protocol",
+    "status",
+    "ping",
+    "country",
+    "error",
+    "error_class",
+    "attempts",
+]
+INTEGER_FIELDS = {"ping", "attempts"}
+BATCH_SIZE = 500
+PARQUET_BATCH_SIZE = 50000
+FLUSH_INTERVAL = 1.0
+
+
+class ResultWriter:
+    """
+    Streams full result records to a file.
+
+    Records are buffered and serialized in batches of `batch_size`, or at
+    least every FLUSH_INTERVAL seconds, so a fast run does not pay one
+    write call per result and a slow run still shows up on disk promptly.
+    """
+
+    batch_size = BATCH_SIZE
+
+    def __init__(self, path, append=False):
+        self.path = path
+        self.append = append
+        self.buffer = []
+        self.last_flush = time()
+
+    def write(self, result):
+        if not result:
+            return
+        self.buffer.append({field: result.get(field) for field in RESULT_FIELDS})
+        if (
+            len(self.buffer) >= self.batch_size
+            or time() - self.last_flush >= FLUSH_INTERVAL
+        ):
+            self.flush()
+
+    def flush(self):
+        if self.buffer:
+            self.write_batch(self.buffer)
+            self.buffer = []
+        self.last_flush = time()
+
+    def write_batch(self, records):
+        raise NotImplementedError
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class JsonlWriter(ResultWriter):
+    """Writes one JSON object per line."""
+
+    def __init__(self, path, append=False):
+        super().__init__(path, append)
+        self.file = open(path, "a" if append else "w", encoding="utf-8")
+
+    def write_batch(self, records):
+        self.file.write("".join(json.dumps(r) + "\n" for r in records))
+        self.file.flush()
+
+    def close(self):
+        super().close()
+        self.file.close()
+
+
+class CsvWriter(ResultWriter):
+    """Writes a CSV file with a header row."""
+
+    def __init__(self, path, append=False):
+        super().__init__(path, append)
+        write_header = not (append and os.path.exists(path) and os.path.getsize(path))
+        self.file = open(path, "a" if append else "w", newline="", encoding="utf-8")
+        self.writer = csv.DictWriter(self.file, fieldnames=RESULT_FIELDS)
+        if write_header:
+            self.writer.writeheader()
+
+    def write_batch(self, records):
+        self.writer.writerows(records)
+        self.file.flush()
+
+    def close(self):
+        super().close()
+        self.file.close()
+
+
+class ParquetWriter(ResultWriter):
+    """
+    Writes a Parquet file, one row group per batch.
+    Requires pyarrow. Parquet files cannot be appended to, so an existing
+    file is always replaced.
+    """
+
+    batch_size = PARQUET_BATCH_SIZE
+
+    def __init__(self, path, append=False):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError(
+                "Parquet output requires pyarrow. Install it with: pip install pyarrow"
+            )
+        super().__init__(path, append)
+        self.pa = pa
+        self.schema = pa.schema(
+            [
+                (field, pa.int64() if field in INTEGER_FIELDS else pa.string())
+                for field in RESULT_FIELDS
+            ]
+        )
+        self.writer = pq.ParquetWriter(path, self.schema)
+
+    def write(self, result):
+        if not result:
+            return
+        self.buffer.append({field: result.get(field) for field in RESULT_FIELDS})
+        if len(self.buffer) >= self.batch_size:
+            self.flush()
+
+    def write_batch(self, records):
+        self.writer.write_table(
+            self.pa.Table.from_pylist(records, schema=self.schema)
+        )
+
+    def close(self):
+        super().close()
+        self.writer.close()
+
+
+WRITERS = {
+    "jsonl": JsonlWriter,
+    "csv": CsvWriter,
+    "parquet": ParquetWriter,
+}
+
+
+def open_writer(path, fmt=None, append=False):
+    """
+    Opens a result writer for path.
+    The format is taken from `fmt` or, failing that, the file extension.
+    """
+    fmt = (fmt or os.path.splitext(path)[1].lstrip(".")).lower()
+    if fmt not in WRITERS:
+        raise ValueError(
+            f"Unsupported result format '{fmt}', expected one of: {', '.join(WRITERS)}"
+        )
+    return WRITERS[fmt](path, append)
@@ -0,0 +1,203 @@
+import heapq
+import itertools
+import random
+from time import time
+
+from metrics import registry
+
+MAX_ATTEMPTS = 3
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 8.0
+RETRY_WINDOW_SHARE = 0.25
+TRANSIENT_CLASSES = {"connect_timeout", "read_timeout", "reset"}
+
+
+def classify_exception(e):
+    """
+    Maps a failed request to an error class.
+
+    connect_timeout, read_timeout  no answer in time (dropped SYN, overload)
+    reset                          connection dropped mid-request
+    refused                        nothing listening on the proxy port
+    proxy_auth                     proxy rejected the credentials
+    ssl                            TLS handshake through the proxy failed
+    proxy_error                    any other proxy-level failure
+    connection_error, request_error, unknown
+    """
+    import requests
+
+    message = str(e).lower()
+    if isinstance(e, requests.exceptions.ConnectTimeout):
+        return "connect_timeout"
+    if isinstance(e, requests.exceptions.ReadTimeout):
+        return "read_timeout"
+    # Only after the timeouts: the message holds the proxy's host and port,
+    # so a bare "407" would match a proxy on port 4070.
+    response = getattr(e, "response", None)
+    if (response is not None and response.status_code == 407) or (
+        "authentication" in message
+    ):
+        return "proxy_auth"
+    if isinstance(e, requests.exceptions.SSLError):
+        return "ssl"
+    if isinstance(e, requests.exceptions.ConnectionError):
+        if "refused" in message:
+            return "refused"
+        if "timed out" in message or "timeout" in message:
+            return "connect_timeout"
+        if (
+            "reset" in message
+            or "aborted" in message
+            or "remotedisconnected" in message
+            or "remote end closed" in message
+            or "closed unexpectedly" in message
+        ):
+            return "reset"
+        if isinstance(e, requests.exceptions.ProxyError):
+            return "proxy_error"
+        return "connection_error"
+    if isinstance(e, requests.exceptions.RequestException):
+        return "request_error"
+    return "unknown"
+
+
+def classify_response(status_code):
+    """Maps a completed request that failed validation to an error class."""
+    if status_code == 407:
+        return "proxy_auth"
+    return "validation"
+
+
+def should_retry(result, max_attempts=MAX_ATTEMPTS):
+    """True if result failed with a transient error and has attempts left."""
+    return (
+        result is not None
+        and result["status"] != "Active"
+        and result.get("error_class") in TRANSIENT_CLASSES
+        and result.get("attempts", 1) < max_attempts
+    )
+
+
+def backoff_delay(attempt):
+    """
+    Full-jitter exponential backoff before retry number `attempt` (1-based),
+    so retries of proxies that failed together do not arrive together.
+    """
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (attempt - 1)))
+
+
+def retry_slots(window, waiting, fresh_left):
+    """
+    How many of a window of in-flight checks may be retries. While fresh
+    proxies are left, retries get RETRY_WINDOW_SHARE of it so fresh work
+    keeps flowing. They get all of it once the input is used up, or once a
+    window's worth of retries is waiting, which keeps the backlog bounded.
+    """
+    if not fresh_left or waiting >= window:
+        return window
+    return max(1, int(window * RETRY_WINDOW_SHARE))
+
+
+class CheckScheduler:
+    """
+    Keeps up to `window` checks in flight, feeding `submit` from waiting
+    retries (within retry_slots) and then from the `proxies` iterable.
+    Failed checks that should_retry go on a heap keyed by their backoff
+    deadline. The caller waits for results, reports each one with
+    finish() and retry(), and calls fill() again.
+    """
+
+    def __init__(self, proxies, submit, window, on_exhausted=None):
+        self.proxies = iter(proxies)
+        self.submit = submit
+        self.window = window
+        self.on_exhausted = on_exhausted
+        self.exhausted = False
+        self.stopped = False
+        self.submitted = 0
+        self.outstanding = 0
+        self.retries_outstanding = 0
+        self.retry_queue = []
+        self.sequence = itertools.count()
+
+    @property
+    def idle(self):
+        """True once nothing is in flight and no retry is waiting."""
+        return not self.outstanding and not self.retry_queue
+
+    def fill(self):
+        """
+        Submits due retries and fresh proxies until the window is full.
+        Returns the seconds until the next retry may go, or None if only a
+        finished check can free room.
+        """
+        if self.stopped:
+            return None
+        now = time()
+        max_retries = retry_slots(
+            self.window, len(self.retry_queue), not self.exhausted
+        )
+        while (
+            self.retry_queue
+            and self.retry_queue[0][0] <= now
+            and self.outstanding < self.window
+            and self.retries_outstanding < max_retries
+        ):
+            _, _, proxy_info = heapq.heappop(self.retry_queue)
+            self.submit(proxy_info)
+            self.outstanding += 1
+            self.retries_outstanding += 1
+        while not self.exhausted and self.outstanding < self.window:
+            proxy_info = next(self.proxies, None)
+            if proxy_info is None:
+                self.exhausted = True
+                if self.on_exhausted:
+                    self.on_exhausted(self.submitted)
+                break
+            self.submit(proxy_info)
+            self.submitted += 1
+            self.outstanding += 1
+
+        if (
+            self.retry_queue
+            and self.outstanding < self.window
+            and self.retries_outstanding < max_retries
+        ):
+            return max(0, self.retry_queue[0][0] - now)
+        return None
+
+    def finish(self, proxy_info):
+        """Frees the window slot of a check that returned, however it ended."""
+        self.outstanding -= 1
+        if proxy_info.get("attempts", 1) > 1:
+            self.retries_outstanding -= 1
+
+    def retry(self, proxy_info, result):
+        """
+        True if the result failed transiently and is not final. It is queued
+        for another attempt unless the scheduler was stopped.
+        """
+        if not should_retry(result):
+            return False
+        if self.stopped:
+            return True
+        attempts = result["attempts"] + 1
+        heapq.heappush(
+            self.retry_queue,
+            (
+                time() + backoff_delay(attempts - 1),
+                next(self.sequence),
+                dict(
+                    proxy_info,
+                    attempts=attempts,
+                    country=result["country"],
+                    protocol=result["protocol"],
+                ),
+            ),
+        )
+        registry.inc("retries_total", error_class=result["error_class"])
+        return True
+
+    def stop(self):
+        """Submits nothing more; retries from here on are dropped."""
+        self.stopped = True
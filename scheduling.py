@@ -0,0 +1,241 @@
+import csv
+import errno
+import json
+import os
+import selectors
+import socket
+from time import perf_counter
+
+from proxy_files import write_atomic
+
+ORDER_MODES = ["input", "score", "connect"]
+CONNECT_TIMEOUT = 3
+CONNECT_CONCURRENCY = 256
+HISTORY_FILE = "history.jsonl"
+
+PORT_POPULARITY = {
+    3128: 1.0,
+    8080: 0.9,
+    1080: 0.9,
+    80: 0.8,
+    8888: 0.7,
+    8000: 0.6,
+    3129: 0.6,
+    9050: 0.6,
+    1081: 0.5,
+    443: 0.5,
+    4145: 0.5,
+    8118: 0.5,
+}
+DEFAULT_PORT_SCORE = 0.3
+
+
+def read_outcomes(path):
+    """
+    Yields (proxy line, active) for every record of a JSONL or CSV results
+    file. Yields nothing if the file is missing or unreadable.
+    """
+    if not path or not os.path.exists(path):
+        return
+    try:
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            if path.endswith(".csv"):
+                records = csv.DictReader(f)
+            else:
+                records = (json.loads(line) for line in f if line.strip())
+            for record in records:
+                yield record["proxy"], record.get("status") == "Active"
+    except (OSError, ValueError, KeyError):
+        return
+
+
+def load_history(path=HISTORY_FILE):
+    """
+    Reads the check history kept by update_history().
+    Returns {proxy line: [successes, checks]}, empty if there is no history.
+    """
+    history = {}
+    if not path or not os.path.exists(path):
+        return history
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    proxy, successes, checks = json.loads(line)
+                    history[proxy] = [successes, checks]
+    except (OSError, ValueError):
+        pass
+    return history
+
+
+def update_history(path, outcomes):
+    """
+    Adds the (proxy line, active) outcomes of a run to the history file.
+    The file keeps one line of totals per proxy, so it grows with the
+    number of distinct proxies rather than with the number of runs.
+    """
+    history = load_history(path)
+    for proxy, active in outcomes:
+        stats = history.setdefault(proxy, [0, 0])
+        stats[0] += active
+        stats[1] += 1
+    write_atomic(
+        path,
+        (
+            json.dumps([proxy, successes, checks])
+            for proxy, (successes, checks) in history.items()
+        ),
+    )
+
+
+def subnet(host):
+    """Returns the /24 of an IPv4 host, or the host itself."""
+    parts = host.split(".")
+    if len(parts) == 4 and all(p.isdigit() for p in parts):
+        return ".".join(parts[:3])
+    return host
+
+
+def subnet_reputation(history, parse):
+    """
+    Aggregates the history per /24 network, since proxies from the same
+    provider or hosting range tend to live and die together.
+    """
+    reputation = {}
+    for line, (successes, checks) in history.items():
+        info = parse(line)
+        if not info:
+            continue
+        stats = reputation.setdefault(subnet(info["host"]), [0, 0])
+        stats[0] += successes
+        stats[1] += checks
+    return reputation
+
+
+def _ratio(stats):
+    if not stats:
+        return 0.5
+    successes, checks = stats
+    return (successes + 1) / (checks + 2)
+
+
+def score_proxy(proxy_info, history, reputation):
+    """
+    Cheap 0..1 estimate of how likely a proxy is to be working, from its own
+    past results, its network's past results and how common its port is.
+    """
+    own = _ratio(history.get(proxy_info["original"]))
+    network = _ratio(reputation.get(subnet(proxy_info["host"])))
+    port = PORT_POPULARITY.get(proxy_info["port"], DEFAULT_PORT_SCORE)
+    return 0.6 * own + 0.25 * network + 0.15 * port
+
+
+def iter_connects(
+    proxies, timeout=CONNECT_TIMEOUT, concurrency=CONNECT_CONCURRENCY, stop=None
+):
+    """
+    Measures the TCP connect time to every proxy from one thread.
+
+    Up to `concurrency` non-blocking connects are in flight at once and
+    multiplexed on a selector. Yields (proxy_info, ms) as each connect
+    finishes, with ms None for proxies that refused, failed or timed out.
+    Ends early once stop() returns True.
+    """
+    selector = selectors.DefaultSelector()
+    pending = iter(proxies)
+    in_flight = {}
+    finished = []
+
+    def launch():
+        while len(in_flight) < concurrency:
+            info = next(pending, None)
+            if info is None:
+                return
+            try:
+                family, socktype, proto, _, address = socket.getaddrinfo(
+                    info["host"], info["port"], 0, socket.SOCK_STREAM
+                )[0]
+                sock = socket.socket(family, socktype, proto)
+            except OSError:
+                finished.append((info, None))
+                continue
+            sock.setblocking(False)
+            code = sock.connect_ex(address)
+            if code not in (0, errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EALREADY):
+                sock.close()
+                finished.append((info, None))
+                continue
+            in_flight[sock] = (info, perf_counter())
+            selector.register(sock, selectors.EVENT_WRITE)
+
+    def finish(sock, latency):
+        info, _ = in_flight.pop(sock)
+        finished.append((info, latency))
+        selector.unregister(sock)
+        sock.close()
+
+    try:
+        launch()
+        while in_flight or finished:
+            yield from finished
+            finished.clear()
+            if stop and stop():
+                return
+            for selector_key, _ in selector.select(0.05):
+                sock = selector_key.fileobj
+                _, start = in_flight[sock]
+                if sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR):
+                    finish(sock, None)
+                else:
+                    finish(sock, round((perf_counter() - start) * 1000))
+            now = perf_counter()
+            for sock in [
+                s for s, (_, start) in in_flight.items() if now - start > timeout
+            ]:
+                finish(sock, None)
+            launch()
+    finally:
+        for sock in in_flight:
+            sock.close()
+        selector.close()
+
+
+def order_proxies(proxies, mode, history=None, parse=None, stop=None):
+    """
+    Returns proxies in the order they should be checked.
+
+    input    keep the input order
+    score    most likely to work first, by history, network and port
+    connect  streamed as their TCP connect succeeds, so checking starts at
+             once and the fastest reachable proxies come first. Connects are
+             started in score order; unreachable proxies follow at the end,
+             by score. Stops early once stop() returns True.
+    """
+    if mode == "input":
+        return list(proxies)
+    if mode not in ORDER_MODES:
+        raise ValueError(
+            f"Unknown order mode '{mode}', expected one of: {', '.join(ORDER_MODES)}"
+        )
+
+    history = history or {}
+    reputation = subnet_reputation(history, parse) if parse and history else {}
+    scores = {p["original"]: score_proxy(p, history, reputation) for p in proxies}
+    by_score = sorted(proxies, key=lambda p: -scores[p["original"]])
+
+    if mode == "score":
+        return by_score
+
+    def connect_order():
+        unreachable = []
+        for info, latency in iter_connects(by_score, stop=stop):
+            if latency is None:
+                unreachable.append(info)
+            else:
+                yield info
+        if stop and stop():
+            return
+        unreachable.sort(key=lambda p: -scores[p["original"]])
+        yield from unreachable
+
+    return connect_order()
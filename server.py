@@ -0,0 +1,201 @@
+import bisect
+import itertools
+import json
+import random
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+API_HOST = "127.0.0.1"
+API_PORT = 8899
+MAX_LIST_SIZE = 1000
+STRATEGIES = ("random", "round_robin")
+
+
+def country_keys(country):
+    """
+    Returns the lookup keys for a country string.
+    Handles "Germany" as well as the GUI's "Germany (DE)" format.
+    """
+    if not country or country.startswith("N/A"):
+        return []
+    match = re.match(r"(.+?)\s*\((\w+)\)$", country)
+    if match:
+        return [match.group(1).lower(), match.group(2).lower()]
+    return [country.lower()]
+
+
+class ProxyGroup:
+    """Active proxies sharing a filter key, sorted by ping."""
+
+    def __init__(self, results):
+        self.results = sorted(results, key=lambda r: r["ping"])
+        self.pings = [r["ping"] for r in self.results]
+        self.cumulative = list(
+            itertools.accumulate(1.0 / max(ping, 1) for ping in self.pings)
+        )
+        self.counter = itertools.count()
+
+    def limit(self, max_ping):
+        """Returns how many proxies are at or below max_ping."""
+        if max_ping is None:
+            return len(self.results)
+        return bisect.bisect_right(self.pings, max_ping)
+
+    def pick(self, strategy, max_ping=None):
+        size = self.limit(max_ping)
+        if size == 0:
+            return None
+        if strategy == "round_robin":
+            return self.results[next(self.counter) % size]
+        point = random.random() * self.cumulative[size - 1]
+        return self.results[
+            min(bisect.bisect_right(self.cumulative, point, 0, size), size - 1)
+        ]
+
+
+class ProxyIndex:
+    """
+    Immutable in-memory index over a set of check results.
+
+    Every active result is filed under each combination of its country and
+    protocol (either may be a wildcard), so a filtered pick is one dict
+    lookup, a bisect for the latency ceiling and then either a counter
+    (round-robin) or a bisect over cumulative 1/ping weights (weighted
+    random, faster proxies are picked more often).
+    """
+
+    def __init__(self, results):
+        buckets = {}
+        for result in results:
+            if result.get("status") != "Active":
+                continue
+            protocol = result.get("protocol")
+            countries = [None] + country_keys(result.get("country"))
+            protocols = [None] if not protocol else [None, protocol]
+            for country in countries:
+                for proto in protocols:
+                    buckets.setdefault((country, proto), []).append(result)
+        self.groups = {key: ProxyGroup(items) for key, items in buckets.items()}
+        self.size = len(self.groups[(None, None)].results) if buckets else 0
+
+    def group(self, country=None, protocol=None):
+        key = (
+            country.lower() if country else None,
+            protocol.lower() if protocol else None,
+        )
+        return self.groups.get(key)
+
+    def pick(self, country=None, protocol=None, max_ping=None, strategy="random"):
+        """Returns one result matching the filters, or None."""
+        group = self.group(country, protocol)
+        return group.pick(strategy, max_ping) if group else None
+
+    def select(self, country=None, protocol=None, max_ping=None, limit=None):
+        """Returns the fastest results matching the filters."""
+        group = self.group(country, protocol)
+        if not group:
+            return []
+        size = group.limit(max_ping)
+        if limit is not None:
+            size = min(size, limit)
+        return group.results[:size]
+
+
+class ProxyAPIHandler(BaseHTTPRequestHandler):
+    """
+    Serves the pool held by the ProxyServer.
+
+    GET /proxy    one proxy, picked by ?strategy=random|round_robin
+    GET /proxies  the fastest matching proxies, up to ?limit=N
+    GET /stats    pool size
+
+    Both selection endpoints accept ?country=, ?protocol= and ?max_ping=
+    filters and return plain text unless ?format=json is given.
+    """
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        index = self.server.index
+
+        try:
+            max_ping = int(params["max_ping"]) if "max_ping" in params else None
+            limit = int(params.get("limit", MAX_LIST_SIZE))
+        except ValueError:
+            self.send_text(400, "Error: max_ping and limit must be integers.\n")
+            return
+        if limit < 0 or (max_ping is not None and max_ping < 0):
+            self.send_text(400, "Error: max_ping and limit must not be negative.\n")
+            return
+        strategy = params.get("strategy", "random")
+        if strategy not in STRATEGIES:
+            self.send_text(
+                400, f"Error: strategy must be one of: {', '.join(STRATEGIES)}.\n"
+            )
+            return
+        filters = {
+            "country": params.get("country"),
+            "protocol": params.get("protocol"),
+            "max_ping": max_ping,
+        }
+        as_json = params.get("format") == "json"
+
+        if url.path == "/proxy":
+            result = index.pick(strategy=strategy, **filters)
+            if result is None:
+                self.send_text(404, "Error: No proxy matches the filters.\n")
+            elif as_json:
+                self.send_json(200, result)
+            else:
+                self.send_text(200, result["proxy"] + "\n")
+        elif url.path == "/proxies":
+            results = index.select(limit=min(limit, MAX_LIST_SIZE), **filters)
+            if as_json:
+                self.send_json(200, results)
+            else:
+                self.send_text(200, "".join(r["proxy"] + "\n" for r in results))
+        elif url.path == "/stats":
+            self.send_json(200, {"active": index.size})
+        else:
+            self.send_text(404, "Error: Unknown endpoint.\n")
+
+    def send_text(self, status, text, content_type="text/plain; charset=utf-8"):
+        body = text.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_json(self, status, data):
+        self.send_text(status, json.dumps(data), "application/json")
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ProxyServer(ThreadingHTTPServer):
+    """
+    HTTP server holding the current ProxyIndex.
+
+    update() builds a new index from fresh results and swaps the reference
+    in one assignment, so request threads never wait on a lock and always
+    see either the old or the new pool.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, host=API_HOST, port=API_PORT):
+        super().__init__((host, port), ProxyAPIHandler)
+        self.index = ProxyIndex([])
+
+    def update(self, results):
+        self.index = ProxyIndex(results)
+
+    def start(self):
+        """Starts serving on a background thread."""
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return thread